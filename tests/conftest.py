@@ -1,5 +1,8 @@
 import os
 
+import pytest
+from django.test.utils import override_settings
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -37,3 +40,20 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True, scope='session')
+def project_test_settings():
+    """Настройки тестов проекта, как у manage.py test (core.runner)."""
+    from core.runner import TEST_SETTINGS
+    with override_settings(**TEST_SETTINGS):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Откат базы после теста не трогает кэш: чистим его, как тесты проекта."""
+    from django.core.cache import cache
+    cache.clear()
+    yield
+    cache.clear()
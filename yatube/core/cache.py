@@ -0,0 +1,243 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY, value BLOB, expires REAL,'
+    ' accessed REAL NOT NULL, size INTEGER NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS cache_meta ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO cache_meta VALUES (0, 0)',
+    # Объём кэша ведут триггеры: он общий для всех процессов
+    # и не требует SUM(size) по всей таблице.
+    'CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN'
+    ' UPDATE cache_meta SET bytes = bytes + NEW.size WHERE id = 0; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN'
+    ' UPDATE cache_meta SET bytes = bytes - OLD.size WHERE id = 0; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size'
+    ' ON cache BEGIN UPDATE cache_meta'
+    ' SET bytes = bytes - OLD.size + NEW.size WHERE id = 0; END',
+)
+
+UPSERT = (
+    'INSERT INTO cache (key, value, expires, accessed, size)'
+    ' VALUES (?, ?, ?, ?, ?)'
+    ' ON CONFLICT (key) DO UPDATE SET value = excluded.value,'
+    ' expires = excluded.expires, accessed = excluded.accessed,'
+    ' size = excluded.size'
+)
+
+# Самые давно читанные записи, суммарно занимающие не меньше ? байт
+EVICT = (
+    'DELETE FROM cache WHERE key IN (SELECT key FROM ('
+    ' SELECT key, size, SUM(size) OVER (ORDER BY accessed, key'
+    ' ROWS UNBOUNDED PRECEDING) AS freed FROM cache'
+    ') WHERE freed - size < ?)'
+)
+
+EVICT_TO = 0.9
+
+# Ключей в одном IN (...): старые сборки SQLite принимают до 999 параметров
+MAX_VARIABLES = 900
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite (WAL), общий для всех воркеров на одном хосте.
+
+    Поддерживает время жизни записей, вытеснение давно не читанных
+    записей при превышении MAX_BYTES и атомарный incr.
+
+    OPTIONS:
+        MAX_BYTES — предельный объём значений в байтах;
+        ACCESS_RESOLUTION — как часто (в секундах) обновлять время
+        последнего чтения записи: без этого каждое чтение было бы записью;
+        BUSY_TIMEOUT — сколько ждать блокировку файла, в секундах.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_bytes = options.get('MAX_BYTES', 64 * 1024 * 1024)
+        self._access_resolution = options.get('ACCESS_RESOLUTION', 10)
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Своё соединение на поток; после fork открываем новое.
+        if getattr(self._local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _dump(value):
+        # Целые числа храним как есть, чтобы incr работал в SQL.
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    @staticmethod
+    def _size(key, value):
+        return len(key) + (8 if isinstance(value, int) else len(value))
+
+    def _write(self, statements):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = statements(db)
+            self._evict(db)
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return result
+
+    def _evict(self, db):
+        (size,) = db.execute(
+            'SELECT bytes FROM cache_meta WHERE id = 0'
+        ).fetchone()
+        if size <= self._max_bytes:
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        (size,) = db.execute(
+            'SELECT bytes FROM cache_meta WHERE id = 0'
+        ).fetchone()
+        # Освобождаем с запасом, чтобы не вытеснять при каждой записи.
+        excess = size - int(self._max_bytes * EVICT_TO)
+        if excess > 0:
+            db.execute(EVICT, (excess,))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        value = self._dump(value)
+        expires = self.get_backend_timeout(timeout)
+
+        def statements(db):
+            now = time.time()
+            return db.execute(
+                UPSERT + ' WHERE cache.expires <= ?',
+                (key, value, expires, now, self._size(key, value), now),
+            ).rowcount == 1
+        return self._write(statements)
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        found = self._select([key])
+        return found[key] if key in found else default
+
+    def get_many(self, keys, version=None):
+        """Все ключи одним SELECT ... WHERE key IN (...)."""
+        keys = {self._key(key, version): key for key in keys}
+        return {
+            keys[key]: value
+            for key, value in self._select(list(keys)).items()
+        }
+
+    def _select(self, keys):
+        """Живые записи ключей; время чтения обновляется одним UPDATE."""
+        found, touched = {}, []
+        now = time.time()
+        for start in range(0, len(keys), MAX_VARIABLES):
+            chunk = keys[start:start + MAX_VARIABLES]
+            rows = self._db.execute(
+                'SELECT key, value, expires, accessed FROM cache'
+                f' WHERE key IN ({", ".join("?" * len(chunk))})', chunk,
+            )
+            for key, value, expires, accessed in rows:
+                if expires is not None and expires <= now:
+                    continue
+                found[key] = self._load(value)
+                if now - accessed > self._access_resolution:
+                    touched.append(key)
+        for start in range(0, len(touched), MAX_VARIABLES):
+            chunk = touched[start:start + MAX_VARIABLES]
+            self._db.execute(
+                'UPDATE cache SET accessed = ?'
+                f' WHERE key IN ({", ".join("?" * len(chunk))})',
+                [now, *chunk],
+            )
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        value = self._dump(value)
+        expires = self.get_backend_timeout(timeout)
+        self._write(lambda db: db.execute(
+            UPSERT, (key, value, expires, time.time(),
+                     self._size(key, value))
+        ))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ?'
+            ' AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        ).rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ?'
+            ' AND (expires IS NULL OR expires > ?)', (key, time.time()),
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно даже между процессами: значение меняется под
+        блокировкой записи BEGIN IMMEDIATE."""
+        key = self._key(key, version)
+
+        def statements(db):
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ?'
+                ' AND (expires IS NULL OR expires > ?)', (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = self._dump(self._load(row[0]) + delta)
+            db.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (value, self._size(key, value), key),
+            )
+            return self._load(value)
+        return self._write(statements)
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
@@ -0,0 +1,23 @@
+from django.conf import settings
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Настроить новое соединение SQLite по SQLITE_PRAGMAS.
+
+    WAL позволяет читать во время записи, busy_timeout заставляет
+    писателя ждать блокировку вместо ошибки "database is locked".
+    Соединения из SQLITE_READ_ONLY_ALIASES и реплики не могут писать.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(settings.SQLITE_PRAGMAS)
+    if (connection.alias in settings.SQLITE_READ_ONLY_ALIASES
+            or connection.alias in settings.DATABASE_REPLICAS):
+        pragmas['query_only'] = 'ON'
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, pragmas)
@@ -0,0 +1,138 @@
+import re
+import threading
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.base import Template
+
+_local = threading.local()
+_hooks_lock = threading.Lock()
+_hooked = set()
+MISSING = object()
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+IN_LISTS = re.compile(r'\bIN \((?:%s|\?)(?:, ?(?:%s|\?))*\)')
+
+
+def normalize(sql):
+    """Форма запроса: без литералов и с IN (...) любой длины."""
+    sql = LITERALS.sub('?', sql)
+    return IN_LISTS.sub('IN (...)', sql)
+
+
+class RequestStats:
+    """Счётчики одного запроса: SQL, обращения к кэшу, рендер шаблонов."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Внутри get_many: его get (как у LocMemCache) уже посчитаны
+        self.cache_batch = False
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    @property
+    def total_time(self):
+        return perf_counter() - self.started
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_time += perf_counter() - started
+
+
+def current():
+    """Счётчики текущего запроса или None, если запрос не измеряется."""
+    return getattr(_local, 'stats', None)
+
+
+@contextmanager
+def collect():
+    """Измерять запрос; вложенный вызов получает те же счётчики."""
+    if current() is not None:
+        yield current()
+        return
+    stats = RequestStats()
+    _local.stats = stats
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            yield stats
+    finally:
+        _local.stats = None
+
+
+def install_hooks():
+    """Обернуть get и get_many кэшей и Template.render.
+
+    Вызывается только при включённых измерениях: пока hooks не
+    установлены, запросы не платят ни за какие обёртки.
+    """
+    with _hooks_lock:
+        if Template not in _hooked:
+            Template.render = _timed_render(Template.render)
+            _hooked.add(Template)
+        for alias in settings.CACHES:
+            backend = type(caches[alias])
+            if backend not in _hooked:
+                backend.get = _counted_get(backend.get)
+                backend.get_many = _counted_get_many(backend.get_many)
+                _hooked.add(backend)
+
+
+def _timed_render(render):
+    def wrapper(self, context):
+        stats = current()
+        if stats is None:
+            return render(self, context)
+        # Вложенные шаблоны (include, карточки) уже входят во внешний.
+        stats.template_depth += 1
+        started = perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += perf_counter() - started
+    return wrapper
+
+
+def _counted_get(get):
+    def wrapper(self, key, default=None, version=None):
+        stats = current()
+        if stats is None or stats.cache_batch:
+            return get(self, key, default, version)
+        value = get(self, key, MISSING, version)
+        if value is MISSING:
+            stats.cache_misses += 1
+            return default
+        stats.cache_hits += 1
+        return value
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    def wrapper(self, keys, version=None):
+        stats = current()
+        if stats is None or stats.cache_batch:
+            return get_many(self, keys, version)
+        keys = list(keys)
+        stats.cache_batch = True
+        try:
+            found = get_many(self, keys, version)
+        finally:
+            stats.cache_batch = False
+        stats.cache_hits += len(found)
+        stats.cache_misses += len(set(keys)) - len(found)
+        return found
+    return wrapper
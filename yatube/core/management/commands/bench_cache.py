@@ -0,0 +1,60 @@
+import shutil
+import tempfile
+from time import perf_counter
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает set, get и incr в LocMemCache, FileBasedCache '
+            'и SQLiteCache. Файлы кэшей создаются во временном каталоге.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=1000)
+        parser.add_argument('--size', type=int, default=20 * 1024,
+                            help='Размер значения в байтах.')
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            # Без вытеснения в LocMem и FileBased: сравниваем сами операции.
+            params = {'OPTIONS': {'MAX_ENTRIES': options['keys'] * 2}}
+            backends = (
+                ('locmem', LocMemCache('bench', params)),
+                ('file', FileBasedCache(f'{directory}/file', params)),
+                ('sqlite', SQLiteCache(f'{directory}/cache.sqlite3', {})),
+            )
+            for name, backend in backends:
+                self.stdout.write(f'{name:>6}: ' + ', '.join(
+                    f'{operation} {seconds * 1e6:8.1f} us'
+                    for operation, seconds in self.run(backend, options)
+                ))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, backend, options):
+        keys = [f'bench:{i}' for i in range(options['keys'])]
+        value = 'x' * options['size']
+        return (
+            ('set', self.measure(lambda: [
+                backend.set(key, value) for key in keys
+            ], len(keys))),
+            ('get', self.measure(lambda: [
+                backend.get(key) for key in keys
+            ], len(keys))),
+            ('incr', self.measure(lambda: [
+                backend.incr('counter') for _ in keys
+            ], len(keys), setup=lambda: backend.set('counter', 0))),
+        )
+
+    @staticmethod
+    def measure(run, count, setup=None):
+        if setup is not None:
+            setup()
+        started = perf_counter()
+        run()
+        return (perf_counter() - started) / count
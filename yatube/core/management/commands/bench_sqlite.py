@@ -0,0 +1,93 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import apply_pragmas
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT, pub_date REAL)',
+    'CREATE INDEX post_date_idx ON post (pub_date DESC, id DESC)',
+)
+READ = 'SELECT id, text FROM post ORDER BY pub_date DESC, id DESC LIMIT 10'
+WRITE = 'INSERT INTO post (text, pub_date) VALUES (?, ?)'
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность одновременных чтений '
+            'и записей в SQLite без настроек и с SQLITE_PRAGMAS. '
+            'База создаётся во временном каталоге.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=3)
+
+    def handle(self, *args, **options):
+        modes = (
+            ('stock', {}, {}),
+            ('tuned', settings.SQLITE_PRAGMAS, {'query_only': 'ON'}),
+        )
+        for mode, pragmas, read_pragmas in modes:
+            directory = tempfile.mkdtemp()
+            try:
+                path = os.path.join(directory, 'bench.sqlite3')
+                db = sqlite3.connect(path)
+                for statement in SCHEMA:
+                    db.execute(statement)
+                db.executemany(WRITE, (('Пост', i) for i in range(10000)))
+                db.commit()
+                db.close()
+                result = self.run(path, pragmas, read_pragmas, options)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            self.stdout.write(
+                f'{mode:>5}: {result["reads"]:8.0f} reads/s, '
+                f'{result["writes"]:7.0f} writes/s, '
+                f'{result["errors"]} "database is locked"'
+            )
+
+    def run(self, path, pragmas, read_pragmas, options):
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+        deadline = perf_counter() + options['seconds']
+
+        def worker(statement, kind, worker_pragmas):
+            db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+            apply_pragmas(db, worker_pragmas)
+            done = errors = 0
+            while perf_counter() < deadline:
+                try:
+                    if kind == 'writes':
+                        with db:
+                            db.execute(statement, ('Пост', perf_counter()))
+                    else:
+                        db.execute(statement).fetchall()
+                    done += 1
+                except sqlite3.OperationalError:
+                    errors += 1
+            db.close()
+            with lock:
+                counts[kind] += done
+                counts['errors'] += errors
+
+        threads = [
+            threading.Thread(target=worker,
+                             args=(READ, 'reads', {**pragmas, **read_pragmas}))
+            for _ in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=(WRITE, 'writes', pragmas))
+            for _ in range(options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counts['reads'] /= options['seconds']
+        counts['writes'] /= options['seconds']
+        return counts
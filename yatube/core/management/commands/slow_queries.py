@@ -0,0 +1,31 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.slow_queries import top_offenders
+
+
+class Command(BaseCommand):
+    help = ('Формы запросов из журнала медленных запросов '
+            'с наибольшим суммарным временем.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument('--log', default=settings.SLOW_QUERY_LOG)
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['log']):
+            self.stdout.write('Медленных запросов нет.')
+            return
+        for shape, stats in top_offenders(options['log'], options['top']):
+            last = stats['last']
+            self.stdout.write(
+                f"{stats['total_ms']:10.1f} ms total, "
+                f"{stats['count']:6} x, max {stats['max_ms']:.1f} ms, "
+                f"views: {', '.join(sorted(stats['views']))}"
+            )
+            self.stdout.write(f'  {shape}')
+            self.stdout.write(f"  last params: {last['params']}")
+            for step in last['plan'] or ():
+                self.stdout.write(f'    {step}')
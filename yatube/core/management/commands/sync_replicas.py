@@ -0,0 +1,37 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def backup(source, target):
+    """Скопировать базу SQLite через backup API: согласованный снимок
+    без остановки записи в основную базу."""
+    source_db = sqlite3.connect(source)
+    target_db = sqlite3.connect(target)
+    try:
+        source_db.backup(target_db)
+    finally:
+        target_db.close()
+        source_db.close()
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик '
+            'из DATABASE_REPLICAS. С --interval повторяет копирование.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Пауза между копиями в секундах.')
+
+    def handle(self, *args, **options):
+        source = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                backup(source, connections[alias].settings_dict['NAME'])
+                self.stdout.write(f'{alias}: synced')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
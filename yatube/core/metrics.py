@@ -0,0 +1,145 @@
+import json
+import os
+import tempfile
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from time import monotonic
+
+from django.conf import settings
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+FAMILIES = {
+    'yatube_requests_total': ('counter', 'Запросы по имени URL.'),
+    'yatube_request_errors_total': ('counter', 'Ответы 5xx по имени URL.'),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время обработки запроса.'
+    ),
+    'yatube_db_queries_total': ('counter', 'SQL-запросы по имени URL.'),
+    'yatube_cache_hits_total': ('counter', 'Попадания в кэш.'),
+    'yatube_cache_misses_total': ('counter', 'Промахи кэша.'),
+    'yatube_feed_cache_total': (
+        'counter', 'Кэш страниц лент: hits, stale и recomputes.'
+    ),
+}
+
+
+class Registry:
+    """Счётчики процесса, периодически сбрасываемые в свой файл.
+
+    Увеличение счётчика — операция со словарём без блокировок:
+    воркер gunicorn обрабатывает запросы по одному. Если интервал
+    сброса ещё не прошёл, сброс откладывается на таймер, поэтому
+    счётчики простаивающего воркера тоже доходят до файла. /metrics
+    складывает файлы всех процессов, поэтому значения верны для
+    любого числа воркеров. Гистограмма хранится как счётчики
+    _bucket, _sum и _count и складывается так же.
+    """
+
+    def __init__(self):
+        self.values = defaultdict(float)
+        self.flushed = monotonic()
+        self.timer = None
+
+    def inc(self, name, labels, value=1):
+        self.values[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name, labels, value):
+        index = bisect_left(BUCKETS, value)
+        for le in BUCKETS[index:]:
+            self.inc(f'{name}_bucket', {**labels, 'le': str(le)})
+        self.inc(f'{name}_bucket', {**labels, 'le': '+Inf'})
+        self.inc(f'{name}_sum', labels, value)
+        self.inc(f'{name}_count', labels)
+
+    def maybe_flush(self):
+        wait = settings.METRICS_FLUSH_INTERVAL - (monotonic() - self.flushed)
+        if wait <= 0:
+            self.flush()
+        elif self.timer is None:
+            self.timer = threading.Timer(
+                wait, self.timed_flush, [settings.METRICS_DIR]
+            )
+            # Не демон: завершающийся воркер дождётся последнего сброса.
+            self.timer.start()
+
+    def timed_flush(self, directory):
+        self.timer = None
+        self.flush(directory)
+
+    def flush(self, directory=None):
+        directory = directory or settings.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        # list() копирует словарь целиком, не отпуская GIL: таймер
+        # не увидит его посреди изменения.
+        rows = [[name, labels, value]
+                for (name, labels), value in list(self.values.items())]
+        # Запись во временный файл и rename: читатель не увидит
+        # наполовину записанный файл.
+        descriptor, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(rows, file)
+        os.replace(path, os.path.join(directory, f'{os.getpid()}.json'))
+        self.flushed = monotonic()
+
+
+REGISTRY = Registry()
+
+
+def collect_all():
+    """Сумма счётчиков из файлов всех процессов (и завершившихся тоже)."""
+    REGISTRY.flush()
+    totals = defaultdict(float)
+    directory = settings.METRICS_DIR
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as file:
+                rows = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in rows:
+            totals[(name, tuple(map(tuple, labels)))] += value
+    return totals
+
+
+def render(totals):
+    """Текстовый формат экспозиции Prometheus."""
+    lines = []
+    for family, (kind, help_text) in FAMILIES.items():
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} {kind}')
+        samples = sorted(
+            ((name, labels, value) for (name, labels), value in totals.items()
+             if name == family or kind == 'histogram'
+             and name.rsplit('_', 1)[0] == family),
+            key=sample_order,
+        )
+        for name, labels, value in samples:
+            if value.is_integer():
+                value = int(value)
+            lines.append(f'{name}{format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def sample_order(sample):
+    # Корзины гистограммы идут по возрастанию границы, +Inf последней.
+    name, labels, value = sample
+    le = dict(labels).get('le')
+    return (
+        name, [pair for pair in labels if pair[0] != 'le'],
+        float(le) if le is not None else 0.0,
+    )
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', r'\\')
+                         .replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in labels
+    )
+    return '{' + pairs + '}'
@@ -0,0 +1,42 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .. import instrumentation
+from ..metrics import REGISTRY
+
+
+class MetricsMiddleware:
+    """Счётчики запросов, ошибок, SQL и кэша по имени URL для /metrics.
+
+    Включается настройкой METRICS.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS:
+            raise MiddlewareNotUsed
+        instrumentation.install_hooks()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = perf_counter()
+        with instrumentation.collect() as stats:
+            response = self.get_response(request)
+        match = request.resolver_match
+        # Имя URL, а не путь: число рядов не растёт с числом страниц.
+        labels = {'view': match.view_name if match else 'unresolved'}
+        REGISTRY.inc('yatube_requests_total', {
+            **labels, 'method': request.method,
+            'status': str(response.status_code),
+        })
+        if response.status_code >= 500:
+            REGISTRY.inc('yatube_request_errors_total', labels)
+        REGISTRY.observe('yatube_request_duration_seconds', labels,
+                         perf_counter() - started)
+        REGISTRY.inc('yatube_db_queries_total', labels, stats.db_queries)
+        REGISTRY.inc('yatube_cache_hits_total', labels, stats.cache_hits)
+        REGISTRY.inc('yatube_cache_misses_total', labels,
+                     stats.cache_misses)
+        REGISTRY.maybe_flush()
+        return response
@@ -0,0 +1,91 @@
+import logging
+import sys
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Node
+
+from ..instrumentation import normalize
+
+logger = logging.getLogger(__name__)
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def template_origin():
+    """Строка шаблона, выполняющая запрос, и итерация {% for %} вокруг неё.
+
+    Итерация ищется выше по стеку: карточка, отрендеренная тегом
+    внутри цикла, получает свой контекст без forloop.
+    """
+    origin = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code is Node.render_annotated.__code__:
+            node = frame.f_locals['self']
+            if origin is None and node.token is not None:
+                origin = (node.origin.name, node.token.lineno)
+            forloop = frame.f_locals['context'].get('forloop')
+            if origin is not None and forloop is not None:
+                return origin, (id(forloop), forloop['counter0'])
+        frame = frame.f_back
+    return None, None
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.shapes = defaultdict(set)
+
+    def __call__(self, execute, sql, params, many, context):
+        origin, iteration = template_origin()
+        if iteration is not None:
+            self.shapes[(normalize(sql), *origin)].add(iteration)
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        return [
+            (sql, template, line, len(iterations))
+            for (sql, template, line), iterations in self.shapes.items()
+            if len(iterations) >= threshold
+        ]
+
+
+class NPlusOneMiddleware:
+    """Находит N+1: запрос одной формы из одной строки шаблона
+    в каждой итерации цикла {% for %}.
+
+    Включается настройкой N_PLUS_ONE_DETECTION. Запрос, повторённый
+    в N_PLUS_ONE_THRESHOLD итерациях и больше, попадает в лог,
+    а при N_PLUS_ONE_RAISE страница падает с NPlusOneError.
+    """
+
+    def __init__(self, get_response):
+        if not settings.N_PLUS_ONE_DETECTION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        repeated = recorder.repeated(settings.N_PLUS_ONE_THRESHOLD)
+        if repeated:
+            self.report(request, repeated)
+        return response
+
+    def report(self, request, repeated):
+        lines = [f'N+1 queries in {request.path}:'] + [
+            f'  {count} x {template}:{line}: {sql}'
+            for sql, template, line, count in repeated
+        ]
+        message = '\n'.join(lines)
+        if settings.N_PLUS_ONE_RAISE:
+            raise NPlusOneError(message)
+        logger.warning(message)
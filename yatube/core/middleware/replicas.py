@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+
+from ..routers import state
+
+COOKIE = 'primary_until'
+
+
+class ReplicaMiddleware:
+    """Решает, можно ли этому запросу читать с реплики.
+
+    Можно, если это страница из DATABASE_REPLICA_VIEWS и пользователь
+    не писал последние DATABASE_REPLICA_STICKY_SECONDS секунд. После
+    записи ставится cookie, и до её истечения все чтения идут
+    в основную базу: пользователь сразу видит свой пост или комментарий.
+    Без реплик cookie тоже ставится: по ней кэш лент (posts.cache)
+    не отдаёт такому пользователю устаревшую страницу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            sticky = float(request.COOKIES.get(COOKIE, 0)) > time.time()
+        except ValueError:
+            sticky = False
+        state.sticky, state.use_replica, state.wrote = sticky, False, False
+        try:
+            response = self.get_response(request)
+            if state.wrote:
+                seconds = settings.DATABASE_REPLICA_STICKY_SECONDS
+                response.set_cookie(COOKIE, str(time.time() + seconds),
+                                    max_age=seconds, httponly=True,
+                                    samesite='Lax')
+        finally:
+            state.sticky = state.use_replica = state.wrote = False
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state.use_replica = not state.sticky and (
+            request.resolver_match.view_name
+            in settings.DATABASE_REPLICA_VIEWS
+        )
@@ -0,0 +1,28 @@
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from ..slow_queries import SlowQueryRecorder
+
+
+class SlowQueryMiddleware:
+    """Пишет в SLOW_QUERY_LOG запросы дольше SLOW_QUERY_THRESHOLD секунд
+    вместе с параметрами, именем URL и планом запроса.
+
+    SLOW_QUERY_THRESHOLD = None отключает журнал.
+    """
+
+    def __init__(self, get_response):
+        if settings.SLOW_QUERY_THRESHOLD is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(
+                    SlowQueryRecorder(connection, request)
+                ))
+            return self.get_response(request)
@@ -0,0 +1,54 @@
+import json
+import logging
+import random
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .. import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+class ServerTimingMiddleware:
+    """Время SQL, рендера шаблонов и всего запроса в заголовке Server-Timing.
+
+    Те же числа вместе с обращениями к кэшу пишутся в лог одной
+    JSON-строкой. Включается настройкой SERVER_TIMING; измеряется доля
+    SERVER_TIMING_SAMPLE_RATE запросов. Выключенный middleware
+    не подключается вовсе.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        instrumentation.install_hooks()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.SERVER_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+        with instrumentation.collect() as stats:
+            response = self.get_response(request)
+        total = stats.total_time
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={stats.db_time * 1000:.1f};'
+            f'desc="{stats.db_queries} queries"',
+            f'cache;desc="{stats.cache_hits} hits, '
+            f'{stats.cache_misses} misses"',
+            f'tpl;dur={stats.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'db_queries': stats.db_queries,
+            'db_ms': round(stats.db_time * 1000, 1),
+            'cache_hits': stats.cache_hits,
+            'cache_misses': stats.cache_misses,
+            'template_ms': round(stats.template_time * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+        }))
+        return response
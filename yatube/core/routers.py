@@ -0,0 +1,53 @@
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Состояние текущего запроса, которое ведёт ReplicaMiddleware
+state = threading.local()
+
+
+class ReadWriteRouter:
+    """Чтение через DATABASE_READ_ALIAS, запись через default.
+
+    Оба алиаса смотрят в один файл SQLite: в режиме WAL читающее
+    соединение не ждёт пишущее. Внутри транзакции читаем из default,
+    иначе не увидели бы собственных незафиксированных изменений.
+    """
+
+    def db_for_read(self, model, **hints):
+        default = connections[DEFAULT_DB_ALIAS]
+        # У базы в памяти (тестовой) нет файла для второго соединения.
+        if default.in_atomic_block or default.is_in_memory_db():
+            return DEFAULT_DB_ALIAS
+        return settings.DATABASE_READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter(ReadWriteRouter):
+    """Чтение лент (DATABASE_REPLICA_VIEWS) с реплик DATABASE_REPLICAS.
+
+    Реплика отстаёт от основной базы, поэтому пользователь, который
+    только что писал, читает основную базу (см. ReplicaMiddleware).
+    Запись отмечается в состоянии запроса.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = super().db_for_read(model, **hints)
+        if (alias != DEFAULT_DB_ALIAS and settings.DATABASE_REPLICAS
+                and getattr(state, 'use_replica', False)):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state.wrote = True
+        return super().db_for_write(model, **hints)
@@ -0,0 +1,28 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# Настройки всех тестов: и manage.py test, и pytest (tests/conftest.py)
+TEST_SETTINGS = {
+    # N+1 в шаблонах роняет страницу (core.middleware.queries).
+    'N_PLUS_ONE_DETECTION': True,
+    'N_PLUS_ONE_RAISE': True,
+    # Кэш в памяти процесса: тесты не делят записи с разработкой.
+    'CACHES': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    },
+}
+
+
+class TestRunner(DiscoverRunner):
+    """Тесты падают на N+1 в шаблонах (core.middleware.queries)."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(**TEST_SETTINGS)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
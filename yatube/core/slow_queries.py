@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from .instrumentation import normalize
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+# Для каждой формы запроса: когда её записали в лог последний раз,
+# сколько раз и сколько секунд она была медленной после этого.
+_shapes = {}
+_shapes_lock = threading.Lock()
+
+
+class SlowQueryRecorder:
+    """Обёртка execute_wrapper: медленные запросы с планом в лог.
+
+    Форма запроса попадает в лог не чаще раза в SLOW_QUERY_LOG_INTERVAL
+    секунд на процесс; пропущенные повторы учитываются в следующей записи.
+    """
+
+    def __init__(self, connection, request):
+        self.connection = connection
+        self.request = request
+
+    @property
+    def view(self):
+        # URL разрешается уже внутри цепочки middleware.
+        match = self.request.resolver_match
+        return match.view_name if match else None
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'explaining', False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - started
+        if duration >= settings.SLOW_QUERY_THRESHOLD:
+            self.record(sql, params, duration, many)
+        return result
+
+    def record(self, sql, params, duration, many):
+        shape = normalize(sql)
+        now = time.time()
+        with _shapes_lock:
+            logged, count, total = _shapes.get(shape, (0, 0, 0.0))
+            count, total = count + 1, total + duration
+            if now - logged < settings.SLOW_QUERY_LOG_INTERVAL:
+                _shapes[shape] = (logged, count, total)
+                return
+            _shapes[shape] = (now, 0, 0.0)
+        entry = {
+            'time': now,
+            'view': self.view,
+            'shape': shape,
+            'sql': sql,
+            'params': repr(params)[:1000],
+            'duration_ms': round(duration * 1000, 1),
+            'count': count,
+            'total_ms': round(total * 1000, 1),
+            'plan': None if many else self.explain(sql, params),
+        }
+        logger.warning('Slow query in %s (%.1f ms): %s',
+                       self.view, entry['duration_ms'], sql)
+        write(entry)
+
+    def explain(self, sql, params):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return None
+        prefix = self.connection.ops.explain_query_prefix()
+        _local.explaining = True
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(f'{prefix} {sql}', params)
+                return [' '.join(map(str, row)) for row in cursor.fetchall()]
+        except Exception as error:
+            return [f'EXPLAIN failed: {error}']
+        finally:
+            _local.explaining = False
+
+
+def write(entry):
+    path = settings.SLOW_QUERY_LOG
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Одна короткая запись в режиме append не перемешивается
+    # с записями других воркеров.
+    with open(path, 'a') as file:
+        file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def top_offenders(path, limit):
+    """Формы запросов с наибольшим суммарным временем из лога."""
+    shapes = defaultdict(lambda: {
+        'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'views': set(),
+    })
+    with open(path) as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            stats = shapes[entry['shape']]
+            stats['count'] += entry['count']
+            stats['total_ms'] += entry['total_ms']
+            stats['max_ms'] = max(stats['max_ms'], entry['duration_ms'])
+            stats['views'].add(entry['view'] or '-')
+            stats['last'] = entry
+    return sorted(
+        shapes.items(), key=lambda item: item[1]['total_ms'], reverse=True
+    )[:limit]
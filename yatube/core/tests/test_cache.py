@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import SQLiteCache
+from ..instrumentation import collect, install_hooks
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_set_get_delete(self):
+        """Значения сохраняются, читаются и удаляются."""
+        self.cache.set('key', {'a': 1})
+        self.assertEqual(self.cache.get('key'), {'a': 1})
+        self.assertTrue(self.cache.has_key('key'))
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_timeout(self):
+        """Просроченная запись не читается, add её перезаписывает."""
+        self.cache.set('key', 'value', timeout=0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_shared_between_instances(self):
+        """Другой экземпляр (как другой воркер) видит те же записи."""
+        self.cache.set('key', 'value')
+        other = self.make_cache()
+        self.assertEqual(other.get('key'), 'value')
+        self.cache.set('counter', 1)
+        self.assertEqual(other.incr('counter', 5), 6)
+        self.assertEqual(self.cache.get('counter'), 6)
+
+    def test_get_many_one_query(self):
+        """get_many читает все ключи одним SELECT, пропуская просроченные."""
+        self.cache.set_many({'a': 1, 'b': 'два', 'c': [3]})
+        self.cache.set('expired', 'x', timeout=0)
+        statements = []
+        self.cache._db.set_trace_callback(statements.append)
+        found = self.cache.get_many(['a', 'b', 'c', 'expired', 'missing'])
+        self.assertEqual(found, {'a': 1, 'b': 'два', 'c': [3]})
+        self.assertEqual(
+            len([sql for sql in statements if sql.startswith('SELECT')]), 1
+        )
+
+    def test_incr_missing_key(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction(self):
+        """При превышении объёма вытесняются давно не читанные записи."""
+        cache = self.make_cache(MAX_BYTES=3000, ACCESS_RESOLUTION=0)
+        cache.set('old', b'x' * 1000)
+        cache.set('used', b'x' * 1000)
+        cache.get('used')
+        cache.set('new', b'x' * 1000)
+        cache.get('used')
+        cache.set('newest', b'x' * 1000)
+        self.assertIsNone(cache.get('old'))
+        self.assertIsNotNone(cache.get('used'))
+        self.assertIsNotNone(cache.get('newest'))
+
+    def test_get_many_counted(self):
+        """Server-Timing и /metrics видят и чтения через get_many."""
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'core.cache.SQLiteCache', 'LOCATION': self.location,
+        }}):
+            install_hooks()
+        self.cache.set_many({'a': 1, 'b': 2})
+        with collect() as stats:
+            self.cache.get_many(['a', 'b', 'missing'])
+            self.cache.get('a')
+        self.assertEqual((stats.cache_hits, stats.cache_misses), (3, 1))
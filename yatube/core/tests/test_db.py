@@ -0,0 +1,58 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from ..db import apply_pragmas
+from ..routers import ReadWriteRouter
+
+
+class SQLitePragmasTests(TestCase):
+    def test_connection_configured(self):
+        """Новое соединение получает настройки из SQLITE_PRAGMAS."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_wal_on_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        db = sqlite3.connect(os.path.join(directory, 'db.sqlite3'))
+        self.addCleanup(db.close)
+        apply_pragmas(db, {'journal_mode': 'WAL'})
+        self.assertEqual(
+            db.execute('PRAGMA journal_mode').fetchone()[0], 'wal'
+        )
+
+
+class ReadWriteRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReadWriteRouter()
+        patcher = mock.patch('core.routers.connections')
+        self.default = patcher.start()['default']
+        self.addCleanup(patcher.stop)
+        self.default.in_atomic_block = False
+        self.default.is_in_memory_db.return_value = False
+
+    def test_reads_go_to_reader(self):
+        self.assertEqual(self.router.db_for_read(None), 'reader')
+        self.assertEqual(self.router.db_for_write(None), 'default')
+
+    def test_reads_inside_transaction_go_to_default(self):
+        """В транзакции читаем свои незафиксированные изменения."""
+        self.default.in_atomic_block = True
+        self.assertEqual(self.router.db_for_read(None), 'default')
+
+    def test_memory_database_reads_default(self):
+        self.default.is_in_memory_db.return_value = True
+        self.assertEqual(self.router.db_for_read(None), 'default')
+
+    def test_migrations_only_on_default(self):
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate('reader', 'posts'))
@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+import tempfile
+from time import monotonic
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..metrics import REGISTRY
+
+METRICS_DIR = tempfile.mkdtemp()
+
+
+@override_settings(METRICS=True, METRICS_DIR=METRICS_DIR)
+class MetricsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        REGISTRY.values.clear()
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+    def tearDown(self):
+        cache.clear()
+
+    def metrics(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requests_by_url_name(self):
+        """Запросы и гистограмма времени считаются по имени URL."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        text = self.metrics()
+        self.assertIn('yatube_requests_total{method="GET",status="200",'
+                      'view="posts:index"} 2', text)
+        self.assertIn('yatube_request_duration_seconds_bucket{'
+                      'le="+Inf",view="posts:index"} 2', text)
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      text)
+        self.assertRegex(
+            text, r'yatube_db_queries_total\{view="posts:index"\} [1-9]'
+        )
+
+    def test_aggregates_worker_files(self):
+        """Счётчики других процессов складываются с текущими."""
+        self.client.get(reverse('about:author'))
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(os.path.join(METRICS_DIR, '1.json'), 'w') as file:
+            json.dump([['yatube_requests_total',
+                        [['method', 'GET'], ['status', '200'],
+                         ['view', 'about:author']], 4]], file)
+        self.assertIn('yatube_requests_total{method="GET",status="200",'
+                      'view="about:author"} 5', self.metrics())
+
+    @override_settings(METRICS_FLUSH_INTERVAL=0.05)
+    def test_flushed_without_next_request(self):
+        """Счётчики попадают в файл и без следующего запроса воркеру."""
+        REGISTRY.flushed = monotonic()
+        self.client.get(reverse('about:author'))
+        REGISTRY.timer.join()
+        with open(os.path.join(METRICS_DIR, f'{os.getpid()}.json')) as file:
+            names = [name for name, labels, value in json.load(file)]
+        self.assertIn('yatube_requests_total', names)
+
+    @override_settings(METRICS=False)
+    def test_disabled(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
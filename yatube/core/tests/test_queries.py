@@ -0,0 +1,52 @@
+from django.contrib.auth.models import Permission
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.template import engines
+from django.test import RequestFactory, TestCase, override_settings
+
+from ..instrumentation import normalize
+from ..middleware.queries import NPlusOneError, NPlusOneMiddleware
+
+TEMPLATE = '''{% for perm in perms %}
+{{ perm.content_type.app_label }}
+{% endfor %}'''
+
+
+def render_permissions(queryset):
+    template = engines['django'].from_string(TEMPLATE)
+
+    def view(request):
+        return HttpResponse(template.render({'perms': queryset[:5]}))
+    return view
+
+
+@override_settings(N_PLUS_ONE_DETECTION=True, N_PLUS_ONE_RAISE=True,
+                   N_PLUS_ONE_THRESHOLD=3)
+class NPlusOneMiddlewareTests(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get('/perms/')
+
+    def test_raises_with_template_line(self):
+        """Запрос в каждой итерации цикла указывает на строку шаблона."""
+        middleware = NPlusOneMiddleware(
+            render_permissions(Permission.objects.all())
+        )
+        with self.assertRaisesRegex(NPlusOneError, r'5 x .*:2: SELECT'):
+            middleware(self.request)
+
+    def test_joined_queryset_passes(self):
+        middleware = NPlusOneMiddleware(render_permissions(
+            Permission.objects.select_related('content_type')
+        ))
+        self.assertEqual(middleware(self.request).status_code, 200)
+
+    @override_settings(N_PLUS_ONE_DETECTION=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            NPlusOneMiddleware(render_permissions(Permission.objects.all()))
+
+    def test_normalize(self):
+        self.assertEqual(
+            normalize("SELECT 1 WHERE a = 'x' AND id IN (%s, %s, %s)"),
+            'SELECT ? WHERE a = ? AND id IN (...)',
+        )
@@ -0,0 +1,106 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import resolve
+
+from ..management.commands.sync_replicas import backup
+from ..middleware.replicas import COOKIE, ReplicaMiddleware
+from ..routers import ReplicaRouter, state
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        patcher = mock.patch('core.routers.connections')
+        default = patcher.start()['default']
+        self.addCleanup(patcher.stop)
+        default.in_atomic_block = False
+        default.is_in_memory_db.return_value = False
+        self.addCleanup(setattr, state, 'use_replica', False)
+
+    def test_feed_reads_go_to_replica(self):
+        state.use_replica = True
+        self.assertEqual(self.router.db_for_read(None), 'replica1')
+
+    def test_other_reads_go_to_reader(self):
+        state.use_replica = False
+        self.assertEqual(self.router.db_for_read(None), 'reader')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'],
+                   DATABASE_REPLICA_STICKY_SECONDS=10)
+class ReplicaMiddlewareTests(SimpleTestCase):
+    def request(self, path, **cookies):
+        request = RequestFactory().get(path)
+        request.COOKIES.update(cookies)
+        request.resolver_match = resolve(path)
+        return request
+
+    def run_view(self, request, view):
+        def get_response(request):
+            middleware.process_view(request, None, (), {})
+            return view(request)
+        middleware = ReplicaMiddleware(get_response)
+        return middleware(request)
+
+    def test_feed_uses_replica(self):
+        seen = []
+        self.run_view(self.request('/'), lambda request: (
+            seen.append(state.use_replica), HttpResponse()
+        )[1])
+        self.assertEqual(seen, [True])
+
+    def test_write_makes_reads_sticky(self):
+        """После записи ставится cookie, и ленты читаются с основной базы."""
+        response = self.run_view(self.request('/create/'), lambda request: (
+            ReplicaRouter().db_for_write(None), HttpResponse()
+        )[1])
+        self.assertIn(COOKIE, response.cookies)
+        seen = []
+        until = response.cookies[COOKIE].value
+        self.run_view(self.request('/', **{COOKIE: until}), lambda request: (
+            seen.append(state.use_replica), HttpResponse()
+        )[1])
+        self.assertEqual(seen, [False])
+
+    def test_expired_cookie(self):
+        seen = []
+        expired = str(time.time() - 1)
+        self.run_view(self.request('/', **{COOKIE: expired}), lambda r: (
+            seen.append(state.use_replica), HttpResponse()
+        )[1])
+        self.assertEqual(seen, [True])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_sticky_without_replicas(self):
+        """Без реплик cookie после записи тоже ставится."""
+        response = self.run_view(self.request('/create/'), lambda request: (
+            ReplicaRouter().db_for_write(None), HttpResponse()
+        )[1])
+        self.assertIn(COOKIE, response.cookies)
+
+
+class SyncReplicasTests(SimpleTestCase):
+    def test_backup(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        source = os.path.join(directory, 'db.sqlite3')
+        target = os.path.join(directory, 'replica.sqlite3')
+        db = sqlite3.connect(source)
+        db.execute('CREATE TABLE post (text TEXT)')
+        db.execute("INSERT INTO post VALUES ('Пост')")
+        db.commit()
+        db.close()
+        backup(source, target)
+        replica = sqlite3.connect(target)
+        self.addCleanup(replica.close)
+        self.assertEqual(
+            replica.execute('SELECT text FROM post').fetchall(), [('Пост',)]
+        )
@@ -0,0 +1,65 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import slow_queries
+
+LOG_DIR = tempfile.mkdtemp()
+LOG = os.path.join(LOG_DIR, 'slow.jsonl')
+
+
+@override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_LOG=LOG,
+                   SLOW_QUERY_LOG_INTERVAL=3600)
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(LOG_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        slow_queries._shapes.clear()
+        if os.path.exists(LOG):
+            os.remove(LOG)
+
+    def tearDown(self):
+        cache.clear()
+
+    def entries(self):
+        with open(LOG) as file:
+            return [json.loads(line) for line in file]
+
+    def test_logged_with_view_and_plan(self):
+        """Запрос ленты пишется с именем URL, параметрами и планом."""
+        with self.assertLogs('core.slow_queries', 'WARNING'):
+            self.client.get(reverse('posts:index'))
+        entry = next(entry for entry in self.entries()
+                     if 'posts_post' in entry['shape'])
+        self.assertEqual(entry['view'], 'posts:index')
+        self.assertIn('params', entry)
+        self.assertTrue(entry['plan'])
+
+    def test_rate_limited_by_shape(self):
+        """Повтор той же формы запроса в интервале не пишется."""
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        with self.assertLogs('core.slow_queries', 'WARNING'):
+            self.client.get(url)
+        logged = len(self.entries())
+        self.client.get(url)
+        self.assertEqual(len(self.entries()), logged)
+        shapes = [entry['shape'] for entry in self.entries()]
+        self.assertEqual(len(shapes), len(set(shapes)))
+
+    def test_top_offenders_command(self):
+        with self.assertLogs('core.slow_queries', 'WARNING'):
+            self.client.get(reverse('posts:index'))
+        out = StringIO()
+        call_command('slow_queries', '--top', '3', stdout=out)
+        self.assertIn('posts:index', out.getvalue())
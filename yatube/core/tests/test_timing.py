@@ -0,0 +1,41 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+
+@override_settings(SERVER_TIMING=True, SERVER_TIMING_SAMPLE_RATE=1.0)
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_header_and_log(self):
+        """Ответ получает Server-Timing, в лог уходит строка JSON."""
+        with self.assertLogs('core.middleware.timing', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        for metric in ('db;dur=', 'cache;desc=', 'tpl;dur=', 'total;dur='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['db_queries'], 0)
+        self.assertGreater(record['cache_misses'], 0)
+
+    def test_about_views(self):
+        response = self.client.get(reverse('about:author'))
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        response = self.client.get(reverse('about:author'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(SERVER_TIMING=False)
+    def test_disabled(self):
+        response = self.client.get(reverse('about:author'))
+        self.assertFalse(response.has_header('Server-Timing'))
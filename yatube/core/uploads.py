@@ -0,0 +1,40 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class OversizedUpload(UploadedFile):
+    """Файл больше UPLOAD_MAX_BYTES: имя и полный размер без содержимого.
+
+    Форма отклоняет его по size с понятной ошибкой.
+    """
+
+    def __init__(self, name, content_type, size):
+        super().__init__(BytesIO(), name, content_type, size)
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """Первый обработчик FILE_UPLOAD_HANDLERS: не даёт файлу больше
+    UPLOAD_MAX_BYTES дойти до памяти или временного файла.
+
+    Байты сверх лимита дочитываются из запроса и отбрасываются,
+    а вместо файла в request.FILES попадает OversizedUpload.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.UPLOAD_MAX_BYTES:
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.received <= settings.UPLOAD_MAX_BYTES:
+            return None
+        return OversizedUpload(self.file_name, self.content_type,
+                               self.received)
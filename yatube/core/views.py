@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from . import metrics as registry
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html',
@@ -8,3 +12,13 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    """Счётчики всех воркеров в формате Prometheus."""
+    if not settings.METRICS:
+        raise Http404
+    return HttpResponse(
+        registry.render(registry.collect_all()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
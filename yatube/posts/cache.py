@@ -0,0 +1,231 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_cache_key, has_vary_header, learn_cache_key
+
+from core.metrics import REGISTRY
+from core.routers import state as db_state
+
+FEED_VERSION_KEY = 'posts:feed_version'
+# Как часто запрос без блокировки проверяет, не готова ли страница
+FEED_CACHE_POLL_INTERVAL = 0.05
+
+
+def feed_version():
+    """Текущая версия лент: входит во все ключи кэша страниц лент."""
+    version = cache.get(FEED_VERSION_KEY)
+    if version is None:
+        # Начинаем со времени, чтобы после вытеснения ключа
+        # не вернуться к версии, под которой ещё лежат старые страницы.
+        cache.add(FEED_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(FEED_VERSION_KEY)
+    return version
+
+
+def bump_feed_version():
+    """Сделать недействительными все закэшированные страницы лент."""
+    try:
+        cache.incr(FEED_VERSION_KEY)
+    except ValueError:
+        feed_version()
+
+
+def object_versions(*names):
+    """Версии отдельных объектов (автора, группы) для ключей карточек."""
+    keys = [f'posts:version:{name}' for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, int(time.time() * 1000), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_object_version(name):
+    try:
+        cache.incr(f'posts:version:{name}')
+    except ValueError:
+        object_versions(name)
+
+
+def card_cache_key(post):
+    return f'posts:card:{post.pk}'
+
+
+def card_stamp(post, versions):
+    """Отметка карточки: время правки поста и версии автора и группы."""
+    return (post.updated.timestamp(),
+            versions[f'posts:version:user:{post.author_id}'],
+            versions[f'posts:version:group:{post.group_id}'])
+
+
+def prefetch_cards(posts):
+    """Разложить по постам страницы их карточки одним get_many.
+
+    Карточка лежит под ключом поста вместе с отметкой (card_stamp),
+    поэтому версии авторов и групп и сами карточки читаются одним
+    запросом к кэшу. Карточка с другой отметкой устарела: вместо её
+    HTML в post._card будет None, и post_card отрендерит её заново.
+    """
+    posts = list(posts)
+    names = sorted({f'user:{post.author_id}' for post in posts}
+                   | {f'group:{post.group_id}' for post in posts})
+    found = cache.get_many([f'posts:version:{name}' for name in names]
+                           + [card_cache_key(post) for post in posts])
+    missing = [name for name in names
+               if f'posts:version:{name}' not in found]
+    if missing:
+        found.update(zip([f'posts:version:{name}' for name in missing],
+                         object_versions(*missing)))
+    for post in posts:
+        stamp = card_stamp(post, found)
+        card = found.get(card_cache_key(post))
+        html = card[1] if card is not None and card[0] == stamp else None
+        post._card = (stamp, html)
+    return posts
+
+
+def feed_cache_context():
+    return {
+        'feed_version': feed_version(),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
+
+
+def cache_feed(key_prefix, soft_timeout=None, timeout=None):
+    """Кэш страницы ленты с отдачей устаревшей копии (stale-while-revalidate).
+
+    Ключ страницы не зависит от версии лент: версия и срок свежести
+    (soft_timeout) хранятся вместе с ответом. Свежая копия отдаётся сразу.
+    Устаревшую или отсутствующую копию пересчитывает только запрос,
+    взявший блокировку в кэше; остальные в это время получают старую
+    копию или ждут новую (serve_locked). Исключение — копия старой
+    версии лент для пользователя, который только что писал (cookie
+    ReplicaMiddleware): он должен сразу увидеть свой пост, поэтому
+    получает страницу без кэша. Сама запись живёт
+    timeout секунд (жёсткий срок). Заголовок max-age не ставится:
+    браузер не должен держать ленту у себя.
+    """
+    def decorator(view):
+        def refresh(request, *args, **kwargs):
+            # Версию берём до рендера: пост, созданный во время рендера,
+            # сделает эту копию устаревшей.
+            version = feed_version()
+            response = view(request, *args, **kwargs)
+            count_feed_cache(key_prefix, 'recomputes')
+            store_feed(request, response, version, key_prefix,
+                       soft_timeout, timeout)
+            return response
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            cache_key = get_cache_key(request, key_prefix, 'GET', cache=cache)
+            entry = cache.get(cache_key) if cache_key is not None else None
+            if entry is not None:
+                response, fresh_until, version = entry
+                if version == feed_version() and time.time() < fresh_until:
+                    count_feed_cache(key_prefix, 'hits')
+                    return response
+            lock = lock_key(request, key_prefix, cache_key)
+            if not acquire_lock(lock):
+                return serve_locked(view, request, args, kwargs, key_prefix,
+                                    entry)
+            try:
+                return refresh(request, *args, **kwargs)
+            finally:
+                cache.delete(lock)
+        return wrapper
+    return decorator
+
+
+def serve_locked(view, request, args, kwargs, key_prefix, entry):
+    """Ответ запросу, которому не досталась блокировка пересчёта.
+
+    Устаревшая копия отдаётся как есть, кроме копии старой версии лент
+    для пользователя, который только что писал. Без копии запрос ждёт,
+    пока её положит воркер с блокировкой, а не дождавшись — рендерит
+    страницу сам, но не сохраняет её.
+    """
+    if entry is None:
+        entry = wait_for_entry(request, key_prefix)
+        if entry is None:
+            return view(request, *args, **kwargs)
+        count_feed_cache(key_prefix, 'hits')
+        return entry[0]
+    response, _, version = entry
+    if version != feed_version() and getattr(db_state, 'sticky', False):
+        return view(request, *args, **kwargs)
+    count_feed_cache(key_prefix, 'stale')
+    return response
+
+
+def wait_for_entry(request, key_prefix):
+    """Копия страницы, появившаяся за FEED_CACHE_LOCK_WAIT секунд."""
+    deadline = time.monotonic() + settings.FEED_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(FEED_CACHE_POLL_INTERVAL)
+        cache_key = get_cache_key(request, key_prefix, 'GET', cache=cache)
+        entry = cache.get(cache_key) if cache_key is not None else None
+        if entry is not None:
+            return entry
+    return None
+
+
+def lock_key(request, key_prefix, cache_key):
+    if cache_key is None:
+        # Страница ещё ни разу не кэшировалась: блокируем её адрес.
+        url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        return f'posts:feed_lock:{key_prefix}:{url}'
+    return f'{cache_key}:lock'
+
+
+def store_feed(request, response, version, key_prefix, soft_timeout,
+               timeout):
+    if not is_cacheable(request, response):
+        return
+    seconds = timeout or settings.FEED_CACHE_TIMEOUT
+    fresh_until = time.time() + (
+        soft_timeout or settings.FEED_CACHE_SOFT_TIMEOUT
+    )
+    cache.set(
+        learn_cache_key(request, response, seconds, key_prefix, cache=cache),
+        (response, fresh_until, version),
+        seconds,
+    )
+
+
+def acquire_lock(lock):
+    """Право пересчитать страницу получает один запрос из всех воркеров."""
+    return cache.add(lock, 1, settings.FEED_CACHE_LOCK_TIMEOUT)
+
+
+def count_feed_cache(key_prefix, event):
+    # Счётчик процесса, а не кэша: запись в общий кэш на каждое
+    # попадание выстроила бы воркеры в очередь. Сумма по всем
+    # процессам — на /metrics.
+    REGISTRY.inc('yatube_feed_cache_total',
+                 {'page': key_prefix, 'event': event})
+
+
+def feed_cache_stats(key_prefix):
+    """Счётчики hits, stale и recomputes этого процесса для префикса."""
+    return {
+        event: int(REGISTRY.values.get((
+            'yatube_feed_cache_total',
+            (('event', event), ('page', key_prefix)),
+        ), 0))
+        for event in ('hits', 'stale', 'recomputes')
+    }
+
+
+def is_cacheable(request, response):
+    if response.streaming or response.status_code != 200:
+        return False
+    # Как в CacheMiddleware: не кэшируем ответ, выдающий новую сессию.
+    return not (not request.COOKIES and response.cookies
+                and has_vary_header(response, 'Cookie'))
@@ -0,0 +1,85 @@
+from collections import Counter
+
+from django.db.models import Count, F
+
+from .models import AuthorStats, Comment, Follow, Post, User
+from .sharding import post_databases
+
+
+def bump(user_id, **deltas):
+    """Атомарно изменить счётчики пользователя на deltas."""
+    changes = {name: F(name) + delta for name, delta in deltas.items()}
+    updated = AuthorStats.objects.filter(user_id=user_id).update(**changes)
+    if not updated and min(deltas.values()) >= 0:
+        AuthorStats.objects.get_or_create(user_id=user_id)
+        AuthorStats.objects.filter(user_id=user_id).update(**changes)
+
+
+def bump_comments(post_id, delta, using=None):
+    """using — база комментария: счётчик лежит в том же шарде."""
+    Post.objects.using(using).filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def reconcile():
+    """Пересчитать все счётчики по таблицам и исправить расхождения.
+
+    Возвращает число исправленных строк счётчиков пользователей и постов.
+    """
+    posts = Counter()
+    for alias in post_databases():
+        posts.update(dict(
+            Post.objects.using(alias).order_by().values('author_id').annotate(
+                n=Count('id')).values_list('author_id', 'n')
+        ))
+    followers = dict(Follow.objects.values('author_id').annotate(
+        n=Count('id')).values_list('author_id', 'n'))
+    following = dict(Follow.objects.values('user_id').annotate(
+        n=Count('id')).values_list('user_id', 'n'))
+    existing = set(AuthorStats.objects.values_list('user_id', flat=True))
+    AuthorStats.objects.bulk_create(
+        AuthorStats(user_id=user_id)
+        for user_id in User.objects.values_list('id', flat=True)
+        if user_id not in existing
+    )
+    drifted = []
+    for stats in AuthorStats.objects.iterator():
+        actual = (
+            posts.get(stats.user_id, 0),
+            followers.get(stats.user_id, 0),
+            following.get(stats.user_id, 0),
+        )
+        stored = (
+            stats.posts_count, stats.followers_count, stats.following_count
+        )
+        if actual != stored:
+            (stats.posts_count, stats.followers_count,
+             stats.following_count) = actual
+            drifted.append(stats)
+    AuthorStats.objects.bulk_update(
+        drifted, ('posts_count', 'followers_count', 'following_count')
+    )
+
+    drifted_posts = 0
+    for alias in post_databases():
+        drifted_posts += reconcile_comments(alias)
+    return len(drifted), drifted_posts
+
+
+def reconcile_comments(alias):
+    """Счётчики комментариев постов одной базы: пост и его комментарии
+    всегда лежат в одном шарде."""
+    comments = dict(
+        Comment.objects.using(alias).order_by().values('post_id').annotate(
+            n=Count('id')).values_list('post_id', 'n')
+    )
+    drifted = []
+    posts = Post.objects.using(alias).only('id', 'comments_count')
+    for post in posts.iterator():
+        actual = comments.get(post.id, 0)
+        if post.comments_count != actual:
+            post.comments_count = actual
+            drifted.append(post)
+    Post.objects.using(alias).bulk_update(drifted, ('comments_count',))
+    return len(drifted)
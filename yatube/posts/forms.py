@@ -1,5 +1,9 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from core.uploads import OversizedUpload
+
+from . import uploads
 from .models import Comment, Post
 
 
@@ -19,6 +23,25 @@ class PostForm(forms.ModelForm):
             'text': ('Добавьте текст для новой записи')
         }
 
+    def clean_image(self):
+        """Новая загрузка проверяется по заголовку и пересохраняется
+        до того, как её целиком декодирует кто-то ещё."""
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            uploads.check_limits(image)
+            image = uploads.normalize(image)
+        return image
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if isinstance(self.files.get(self.add_prefix('image')),
+                      OversizedUpload):
+            # ImageField не открыл файл без содержимого и сообщил
+            # о битой картинке, а причина — размер.
+            self.errors.pop('image', None)
+            self.add_error('image', uploads.too_large())
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,64 @@
+import hashlib
+
+from django.core.files.storage import default_storage
+from PIL import Image
+
+# Поля поста, которые заполняет describe
+FIELDS = ('image_width', 'image_height', 'image_size', 'image_hash')
+EXIF_ORIENTATION = 0x0112
+# Ориентации EXIF с поворотом на 90°: ширина и высота меняются местами
+ROTATED = frozenset((5, 6, 7, 8))
+MISSING = 'файл не найден'
+
+
+def describe(file):
+    """Размеры с учётом ориентации EXIF, объём в байтах и sha256 файла.
+
+    Файл читается один раз ради хеша, Pillow — только заголовок.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in file.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        if image.getexif().get(EXIF_ORIENTATION) in ROTATED:
+            width, height = height, width
+    file.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_size': size,
+        'image_hash': digest.hexdigest(),
+    }
+
+
+def stored(name):
+    """describe для файла из хранилища и описание ошибки.
+
+    Отсутствующий или нечитаемый файл не прерывает обход: вместо
+    полей возвращается None и причина.
+    """
+    try:
+        with default_storage.open(name) as file:
+            return describe(file), None
+    except FileNotFoundError:
+        return None, MISSING
+    except (OSError, Image.DecompressionBombError) as error:
+        return None, f'файл не читается: {error}'
+
+
+def refresh(post):
+    """Заполнить поля картинки перед сохранением поста.
+
+    Читается только новая загрузка: файлы, уже лежащие в хранилище,
+    описывает команда backfill_image_meta.
+    """
+    if not post.image:
+        post.image_width = post.image_height = post.image_size = None
+        post.image_hash = ''
+    elif not post.image._committed:
+        for field, value in describe(post.image).items():
+            setattr(post, field, value)
@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.http import Http404
+
+from .models import Group, User
+
+
+class TwoLevelLookup:
+    """Поиск строки по уникальному полю через два уровня кэша.
+
+    Первый уровень — небольшой LRU в памяти процесса, второй — общий
+    кэш Django. Записи обоих уровней привязаны к поколению модели:
+    сигналы увеличивают счётчик поколения в общем кэше, и каждый
+    воркер при следующем же запросе перестаёт видеть старые записи.
+    В кэше лежат только значения полей, объект собирается заново
+    при каждом обращении, поэтому запросы не делят один экземпляр.
+    """
+
+    def __init__(self, model, field, fields, size=None):
+        self.model = model
+        self.field = field
+        self.fields = fields
+        self.size = size or settings.LOOKUP_CACHE_SIZE
+        self.name = f'posts:lookup:{model._meta.label_lower}'
+        self._local = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def generation(self):
+        key = f'{self.name}:generation'
+        generation = cache.get(key)
+        if generation is None:
+            cache.add(key, int(time.time() * 1000), None)
+            generation = cache.get(key)
+        return generation
+
+    def invalidate(self):
+        try:
+            cache.incr(f'{self.name}:generation')
+        except ValueError:
+            self.generation()
+
+    def get_or_404(self, value):
+        generation = self.generation()
+        values = self._get_local(generation, value)
+        if values is None:
+            key = f'{self.name}:{generation}:{value}'
+            values = cache.get(key)
+            if values is None:
+                values = self.model.objects.filter(
+                    **{self.field: value}
+                ).values_list(*self.fields).first()
+                if values is None:
+                    raise Http404(
+                        f'{self.model._meta.object_name} matching query '
+                        f'does not exist.'
+                    )
+                cache.set(key, values, settings.LOOKUP_CACHE_TIMEOUT)
+            self._set_local(generation, value, values)
+        return self.model.from_db(
+            router.db_for_read(self.model), self.fields, values
+        )
+
+    def _get_local(self, generation, value):
+        with self._lock:
+            if generation != self._generation:
+                self._local.clear()
+                self._generation = generation
+                return None
+            values = self._local.get(value)
+            if values is not None:
+                self._local.move_to_end(value)
+            return values
+
+    def _set_local(self, generation, value, values):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._local[value] = values
+            if len(self._local) > self.size:
+                self._local.popitem(last=False)
+
+
+groups = TwoLevelLookup(
+    Group, 'slug', ('id', 'title', 'slug', 'description')
+)
+# Только поля, нужные на страницах: хэш пароля в общий кэш не кладём.
+users = TwoLevelLookup(
+    User, 'username', ('id', 'username', 'first_name', 'last_name')
+)
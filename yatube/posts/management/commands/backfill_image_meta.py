@@ -0,0 +1,55 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts import image_meta
+from posts.models import Post
+from posts.sharding import post_databases
+from posts.thumbnails import make_pool
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, объём и хеш картинок постов, '
+            'сохранённых до появления этих полей. Файлы читаются '
+            'в пуле процессов, поля обновляются пачками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--batch', type=int, default=500,
+                            help='постов в одном bulk_update')
+
+    def handle(self, *args, **options):
+        described = missing = unreadable = 0
+        with make_pool(options['workers']) as pool:
+            for alias in post_databases():
+                pending = list(
+                    Post.objects.using(alias).exclude(image='').filter(
+                        image_hash=''
+                    ).values_list('pk', 'image')
+                )
+                for start in range(0, len(pending), options['batch']):
+                    batch = pending[start:start + options['batch']]
+                    found, errors = self.describe(pool, alias, batch)
+                    described += found
+                    missing += errors.count(image_meta.MISSING)
+                    unreadable += len(errors) - errors.count(
+                        image_meta.MISSING
+                    )
+        self.stdout.write(
+            f'Заполнено картинок: {described}, файлов не найдено: {missing}, '
+            f'не прочитано: {unreadable}'
+        )
+
+    def describe(self, pool, alias, batch):
+        """Обновить поля пачки; вернуть число описанных и ошибки."""
+        names = [name for pk, name in batch]
+        posts, errors = [], []
+        results = pool.map(image_meta.stored, names)
+        for (pk, name), (meta, error) in zip(batch, results):
+            if meta is None:
+                self.stderr.write(f'{name}: {error}')
+                errors.append(error)
+            else:
+                posts.append(Post(pk=pk, **meta))
+        Post.objects.using(alias).bulk_update(posts, image_meta.FIELDS)
+        return len(posts), errors
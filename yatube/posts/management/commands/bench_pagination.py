@@ -0,0 +1,75 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+
+from posts.models import Post, User
+from posts.paginator import NEXT, CursorPaginator
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает стоимость первой и глубокой страницы ленты '
+            'для OFFSET-пагинации и пагинации по курсору. '
+            'Данные создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        deep = options['page']
+        with transaction.atomic():
+            self.fill(deep * settings.NUMBER_POSTS + settings.NUMBER_POSTS)
+            post_list = Post.objects.select_related('author', 'group')
+            rows = [
+                ('offset', 1, self.offset(post_list, 1, options)),
+                ('offset', deep, self.offset(post_list, deep, options)),
+                ('cursor', 1, self.cursor(post_list, 1, options)),
+                ('cursor', deep, self.cursor(post_list, deep, options)),
+            ]
+            transaction.set_rollback(True)
+        for kind, number, seconds in rows:
+            self.stdout.write(
+                f'{kind:>6} page {number:>6}: {seconds * 1000:8.2f} ms'
+            )
+
+    def fill(self, total):
+        author = User.objects.create(username='bench_pagination')
+        for start in range(0, total, BATCH_SIZE):
+            Post.objects.bulk_create(
+                Post(text=f'Пост {i}', author=author)
+                for i in range(start, min(start + BATCH_SIZE, total))
+            )
+
+    def offset(self, post_list, number, options):
+        def run():
+            paginator = Paginator(post_list, settings.NUMBER_POSTS)
+            list(paginator.get_page(number))
+        return self.measure(run, options['repeat'])
+
+    def cursor(self, post_list, number, options):
+        paginator = CursorPaginator(post_list, settings.NUMBER_POSTS)
+        token = None
+        if number > 1:
+            # Курсор глубокой страницы строим заранее, вне замера.
+            last = post_list.order_by('-pub_date', '-id')[
+                (number - 1) * settings.NUMBER_POSTS - 1
+            ]
+            token = paginator.encode_cursor(NEXT, last, number)
+
+        def run():
+            list(CursorPaginator(post_list, settings.NUMBER_POSTS)
+                 .get_page(token))
+        return self.measure(run, options['repeat'])
+
+    @staticmethod
+    def measure(run, repeat):
+        run()
+        started = perf_counter()
+        for _ in range(repeat):
+            run()
+        return (perf_counter() - started) / repeat
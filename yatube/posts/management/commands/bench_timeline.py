@@ -0,0 +1,75 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts.counters import bump
+from posts.models import Follow, Post, User
+from posts.timeline import PULL_AUTHORS_KEY, TimelinePaginator, pull_authors
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержку публикации поста и чтения ленты подписок '
+            'при раскладке по лентам и при подмешивании на чтении. '
+            'Данные создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=20000)
+        parser.add_argument('--posts', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        modes = (
+            ('push', options['followers'] + 1),
+            ('hybrid', options['followers'] - 1),
+        )
+        results = []
+        for mode, threshold in modes:
+            with transaction.atomic(), override_settings(
+                TIMELINE_FANOUT_THRESHOLD=threshold
+            ):
+                author, reader = self.fill(options['followers'])
+                cache.delete(PULL_AUTHORS_KEY)
+                if (author.pk in pull_authors()) != (mode == 'hybrid'):
+                    raise CommandError(f'Автор не в режиме {mode}.')
+                write = self.write(author, options['posts'])
+                read = self.read(reader, options['repeat'])
+                results.append((mode, write, read))
+                transaction.set_rollback(True)
+        cache.delete(PULL_AUTHORS_KEY)
+        for mode, write, read in results:
+            self.stdout.write(
+                f'{mode:>6}: post create {write * 1000:8.2f} ms, '
+                f'follow feed page {read * 1000:8.2f} ms'
+            )
+
+    def fill(self, followers):
+        author = User.objects.create(username='bench_author')
+        User.objects.bulk_create(
+            User(username=f'bench_reader_{i}') for i in range(followers)
+        )
+        readers = User.objects.filter(username__startswith='bench_reader_')
+        Follow.objects.bulk_create(
+            Follow(user_id=user_id, author=author)
+            for user_id in readers.values_list('id', flat=True)
+        )
+        # bulk_create не вызывает сигналы: счётчик, по которому
+        # pull_authors() выбирает режим, ставим сами.
+        bump(author.pk, followers_count=followers)
+        return author, readers.first()
+
+    def write(self, author, posts):
+        started = perf_counter()
+        for i in range(posts):
+            Post.objects.create(author=author, text=f'Пост {i}')
+        return (perf_counter() - started) / posts
+
+    def read(self, reader, repeat):
+        started = perf_counter()
+        for _ in range(repeat):
+            paginator = TimelinePaginator(reader, settings.NUMBER_POSTS)
+            list(paginator.get_page(None))
+        return (perf_counter() - started) / repeat
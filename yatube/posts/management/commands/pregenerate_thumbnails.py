@@ -0,0 +1,47 @@
+import os
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Post
+from posts.sharding import post_databases
+from posts.thumbnails import generate, lookup_many, make_pool, presets
+
+
+class Command(BaseCommand):
+    help = ('Создаёт в пуле процессов миниатюры POST_THUMBNAILS '
+            'и варианты POST_IMAGE_VARIANTS для картинок постов, '
+            'у которых их ещё нет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        names = set()
+        for alias in post_databases():
+            names.update(
+                Post.objects.using(alias).exclude(image='').values_list(
+                    'image', flat=True
+                )
+            )
+        found = lookup_many(
+            [ImageFile(name) for name in names], list(presets())
+        )
+        pending = sorted({
+            name for (name, preset), thumbnail in found.items()
+            if thumbnail is None
+        })
+        failed = 0
+        with make_pool(options['workers']) as pool:
+            futures = {pool.submit(generate, name): name for name in pending}
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    failed += 1
+                    self.stderr.write(
+                        f'{futures[future]}: {future.exception()!r}'
+                    )
+        self.stdout.write(
+            f'Миниатюр создано для {len(pending) - failed} картинок, '
+            f'ошибок: {failed}'
+        )
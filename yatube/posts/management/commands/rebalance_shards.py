@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from posts.models import Post
+from posts.sharding import move_author, placement
+
+
+class Command(BaseCommand):
+    help = ('Переносит посты и комментарии авторов в их шарды POST_SHARDS: '
+            'из default при включении шардирования и между шардами '
+            'после изменения списка шардов. Записи, сделанные во время '
+            'переноса автора, докопируются после его переключения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--author', type=int,
+                            help='id автора, которого нужно перенести')
+        parser.add_argument('--to',
+                            help='шард для --author вместо вычисленного')
+
+    def handle(self, *args, **options):
+        if not settings.POST_SHARDS:
+            raise CommandError('POST_SHARDS пуст: шардирование выключено.')
+        author, target = options['author'], options['to']
+        if target and (not author or target not in settings.POST_SHARDS):
+            raise CommandError('--to требует --author и шард из POST_SHARDS.')
+        moved = authors = 0
+        for alias in (DEFAULT_DB_ALIAS, *settings.POST_SHARDS):
+            found = Post.objects.using(alias).order_by().values_list(
+                'author_id', flat=True
+            ).distinct()
+            if author:
+                found = found.filter(author_id=author)
+            for author_id in list(found):
+                destination = target or placement(author_id)
+                if destination != alias:
+                    moved += move_author(author_id, alias, destination)
+                    authors += 1
+        if target and not authors:
+            # У автора ещё нет постов: достаточно закрепить шард.
+            move_author(author, target, target)
+        self.stdout.write(
+            f'Перенесено постов: {moved}, авторов: {authors}'
+        )
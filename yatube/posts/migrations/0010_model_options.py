@@ -0,0 +1,77 @@
+# Generated by Django 2.2.16 on 2026-10-18 01:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0009_auto_20230219_1921'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ('-created',), 'verbose_name_plural': 'Комментарии'},
+        ),
+        migrations.AlterModelOptions(
+            name='follow',
+            options={'verbose_name': 'Подписка', 'verbose_name_plural': 'Подписки'},
+        ),
+        migrations.AlterModelOptions(
+            name='group',
+            options={'ordering': ('-pk',), 'verbose_name_plural': 'Группы'},
+        ),
+        migrations.AlterModelOptions(
+            name='post',
+            options={'ordering': ['-pub_date'], 'verbose_name_plural': 'Посты'},
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='posts.Post', verbose_name='Посты'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='text',
+            field=models.TextField(verbose_name='Текст'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follower', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='posts', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='posts', to='posts.Group', verbose_name='Группа'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='pub_date',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='text',
+            field=models.TextField(verbose_name='Текст'),
+        ),
+    ]
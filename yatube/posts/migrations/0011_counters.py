@@ -0,0 +1,62 @@
+# Generated by Django 2.2.16 on 2026-10-18 01:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+
+    def counts(queryset, field):
+        return dict(queryset.order_by().values(field).annotate(
+            n=models.Count('id')).values_list(field, 'n'))
+
+    posts = counts(Post.objects, 'author_id')
+    followers = counts(Follow.objects, 'author_id')
+    following = counts(Follow.objects, 'user_id')
+    AuthorStats.objects.bulk_create(
+        AuthorStats(
+            user_id=user_id,
+            posts_count=posts.get(user_id, 0),
+            followers_count=followers.get(user_id, 0),
+            following_count=following.get(user_id, 0),
+        )
+        for user_id in User.objects.values_list('id', flat=True)
+    )
+    for post_id, n in counts(Comment.objects, 'post_id').items():
+        Post.objects.filter(pk=post_id).update(comments_count=n)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0010_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.IntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.IntegerField(db_index=True, default=0, verbose_name='Подписчиков')),
+                ('following_count', models.IntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики',
+                'verbose_name_plural': 'Счётчики',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0, verbose_name='Комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
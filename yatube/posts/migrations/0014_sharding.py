@@ -0,0 +1,68 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0013_post_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorShard',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='shard', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('shard', models.CharField(max_length=100, verbose_name='Шард')),
+            ],
+            options={
+                'verbose_name': 'Шард автора',
+                'verbose_name_plural': 'Шарды авторов',
+            },
+        ),
+        migrations.CreateModel(
+            name='CommentKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'Ключ комментария',
+                'verbose_name_plural': 'Ключи комментариев',
+            },
+        ),
+        migrations.CreateModel(
+            name='PostKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author_id', models.IntegerField(verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Ключ поста',
+                'verbose_name_plural': 'Ключи постов',
+            },
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='author',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='author',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='posts', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='group',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='posts', to='posts.Group', verbose_name='Группа'),
+        ),
+        migrations.AlterField(
+            model_name='timelineentry',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик'),
+        ),
+    ]
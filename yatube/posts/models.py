@@ -19,12 +19,72 @@ class Group(models.Model):
         return self.title
 
 
+class ShardedQuerySet(models.QuerySet):
+    """Выборки моделей, которые могут лежать в шардах (POST_SHARDS).
+
+    create() без явного using() отдаёт выбор базы роутеру по самому
+    объекту: менеджер без объекта шарда не знает.
+    """
+
+    def create(self, **kwargs):
+        if not settings.POST_SHARDS or self._db:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+
+class PostQuerySet(ShardedQuerySet):
+    """Выборки постов для лент.
+
+    Каждая лента берёт одним запросом ровно те колонки, что нужны
+    карточке поста (includes/card_posts.html) и ключу её кэша.
+    """
+
+    CARD_FIELDS = (
+        'text', 'pub_date', 'updated', 'image', 'image_width', 'image_height',
+        'author__username', 'author__first_name', 'author__last_name',
+        'group__slug',
+    )
+    # В шарде нет пользователей и групп: их подставляет
+    # posts.sharding.attach_related после выборки.
+    SHARD_CARD_FIELDS = (
+        'text', 'pub_date', 'updated', 'image', 'image_width', 'image_height',
+        'author', 'group',
+    )
+
+    def feed(self):
+        if settings.POST_SHARDS:
+            return self.only(*self.SHARD_CARD_FIELDS)
+        return self.select_related('author', 'group').only(*self.CARD_FIELDS)
+
+    def by_group(self, group):
+        return self.feed().filter(group=group)
+
+    def by_author(self, author):
+        return self.feed().filter(author=author)
+
+    def for_follower(self, user):
+        """Лента подписок читается из TimelineEntry по индексу
+        (user, pub_date, post), поэтому возвращает записи ленты
+        с постами в тех же колонках."""
+        return TimelineEntry.objects.filter(user=user).select_related(
+            'post__author', 'post__group'
+        ).only('pub_date', 'post_id', *(
+            f'post__{field}' for field in self.CARD_FIELDS
+        ))
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name="Текст")
     pub_date = models.DateTimeField(auto_now_add=True, verbose_name="Дата")
+    updated = models.DateTimeField(auto_now=True, verbose_name="Изменён")
+    # Пост может лежать в шарде (POST_SHARDS), а пользователи и группы
+    # всегда в default, поэтому внешние ключи без ограничений в базе.
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name="posts",
         verbose_name="Автор")
 
@@ -34,6 +94,7 @@ class Post(models.Model):
         null=True,
         related_name="posts",
         on_delete=models.SET_NULL,
+        db_constraint=False,
         verbose_name="Группа")
 
     image = models.ImageField(
@@ -41,9 +102,47 @@ class Post(models.Model):
         upload_to="posts/",
         blank=True
     )
+    # Заполняются при сохранении (posts.image_meta): карточкам
+    # не нужно открывать файл ради размеров.
+    image_width = models.PositiveIntegerField(
+        null=True, blank=True, editable=False, verbose_name='Ширина картинки'
+    )
+    image_height = models.PositiveIntegerField(
+        null=True, blank=True, editable=False, verbose_name='Высота картинки'
+    )
+    image_size = models.PositiveIntegerField(
+        null=True, blank=True, editable=False,
+        verbose_name='Объём картинки, байт'
+    )
+    image_hash = models.CharField(
+        max_length=64, blank=True, editable=False,
+        verbose_name='SHA-256 картинки'
+    )
+    comments_count = models.IntegerField(
+        default=0,
+        verbose_name='Комментариев'
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta():
         ordering = ['-pub_date']
+        # Ленты сортируются по (-pub_date, -id), id добавлен в индексы,
+        # чтобы сортировка целиком шла по индексу.
+        indexes = [
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_date_idx'
+            ),
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_date_idx'
+            ),
+        ]
         verbose_name_plural = 'Посты'
 
     def __str__(self) -> str:
@@ -60,14 +159,23 @@ class Comment(models.Model):
     author = models.ForeignKey(
         User,
         on_delete=CASCADE,
+        db_constraint=False,
         related_name='comments',
         verbose_name='Автор',
     )
     text = models.TextField(verbose_name='Текст')
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = ShardedQuerySet.as_manager()
+
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created_idx'
+            ),
+        ]
         verbose_name_plural = 'Комментарии'
 
     def __str__(self):
@@ -95,8 +203,135 @@ class Follow(models.Model):
                 name="unique_pair"
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=('author', 'user'),
+                name='follow_author_user_idx'
+            ),
+        ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
 
     def __str__(self):
         return f"{self.user.username} follows {self.author.username}"
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, обновляемые при записи, а не COUNT(*)."""
+    user = models.OneToOneField(
+        User,
+        on_delete=CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.IntegerField(default=0, verbose_name='Постов')
+    followers_count = models.IntegerField(
+        default=0,
+        db_index=True,
+        verbose_name='Подписчиков'
+    )
+    following_count = models.IntegerField(
+        default=0,
+        verbose_name='Подписок'
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики'
+        verbose_name_plural = 'Счётчики'
+
+    def __str__(self):
+        return f'stats of {self.user_id}'
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок: пост автора, на которого подписан user.
+
+    Дата публикации копируется из поста, чтобы лента читалась
+    по одному индексу без join и сортировки.
+    """
+    # Пустая копия таблицы есть в шардах, где нет пользователей.
+    user = models.ForeignKey(
+        User,
+        on_delete=CASCADE,
+        db_constraint=False,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=CASCADE,
+        related_name='timeline',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_date_idx'
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+
+    def __str__(self):
+        return f'{self.post_id} in timeline of {self.user_id}'
+
+
+class AuthorShard(models.Model):
+    """Карта шардов: в каком алиасе POST_SHARDS лежат посты автора.
+
+    Строка появляется с первым постом автора и меняется только
+    командой rebalance_shards.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=CASCADE,
+        primary_key=True,
+        related_name='shard',
+        verbose_name='Автор',
+    )
+    shard = models.CharField(max_length=100, verbose_name='Шард')
+
+    class Meta:
+        verbose_name = 'Шард автора'
+        verbose_name_plural = 'Шарды авторов'
+
+    def __str__(self):
+        return f'{self.author_id} in {self.shard}'
+
+
+class PostKey(models.Model):
+    """Глобальный id поста и автор, по которому ищется его шард.
+
+    У каждого шарда своя автонумерация, поэтому id постов выдаёт
+    эта таблица в default.
+    """
+    author_id = models.IntegerField(verbose_name='Автор')
+
+    class Meta:
+        verbose_name = 'Ключ поста'
+        verbose_name_plural = 'Ключи постов'
+
+    def __str__(self):
+        return f'post {self.pk} of {self.author_id}'
+
+
+class CommentKey(models.Model):
+    """Глобальный id комментария: комментарии переезжают между шардами
+    вместе с постом и не должны совпасть по id с чужими."""
+
+    class Meta:
+        verbose_name = 'Ключ комментария'
+        verbose_name_plural = 'Ключи комментариев'
+
+    def __str__(self):
+        return f'comment {self.pk}'
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import math
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .cache import feed_version
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+# Ссылка на страницу в шаблоне; номер None — пропуск «…»,
+# курсор '' — первая страница, None — текущая.
+PageLink = namedtuple('PageLink', 'number cursor')
+GAP = PageLink(None, None)
+
+
+class CursorPaginator(Paginator):
+    """Постраничный вывод по ключу (keyset) вместо OFFSET + COUNT.
+
+    Страница выбирается условием по ключу сортировки относительно
+    последней показанной записи, поэтому 10000-я страница стоит столько же,
+    сколько первая. Общее число записей не считается: известно только,
+    есть ли страница дальше.
+    """
+
+    # Сколько страниц читается в направлении листания. Записи сверх
+    # первой страницы остаются в self.beyond.
+    pages_ahead = 1
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id'),
+                 lookups=None):
+        super().__init__(object_list, per_page)
+        # keys — атрибуты объекта, из которых собирается курсор,
+        # lookups — поля, по которым идут фильтр и сортировка в запросе.
+        self.keys = tuple(keys)
+        self.lookups = tuple(lookups or keys)
+        self.num_pages = 1
+        self.count = 0
+
+    def _check_object_list_is_ordered(self):
+        # Порядок задаёт сам пагинатор по lookups.
+        pass
+
+    def get_page(self, cursor):
+        return self.page(cursor)
+
+    def page(self, cursor):
+        direction, values, number = self.decode_cursor(cursor)
+        backwards = direction == PREVIOUS
+        rows = self.fetch(
+            values, backwards, self.per_page * self.pages_ahead + 1
+        )
+        more = len(rows) > self.per_page
+        rows, self.beyond = rows[:self.per_page], rows[self.per_page:]
+        self.backwards = backwards
+        if backwards:
+            rows.reverse()
+            if not more and len(rows) < self.per_page:
+                # Перед курсором меньше страницы: показываем начало ленты.
+                return self.page(None)
+            number = max(number, 2) if more else 1
+            has_next = True
+        else:
+            has_next = more
+        self.num_pages = number + 1 if has_next else number
+        self.count = (number - 1) * self.per_page + len(rows) + int(has_next)
+        page = self._get_page(rows, number, self)
+        page.next_cursor = page.previous_cursor = None
+        if has_next and rows:
+            page.next_cursor = self.encode_cursor(NEXT, rows[-1], number + 1)
+        if number > 1 and rows:
+            page.previous_cursor = self.encode_cursor(
+                PREVIOUS, rows[0], number - 1
+            )
+        return page
+
+    def fetch(self, values, backwards, limit):
+        """Вернуть не больше limit объектов после курсора (или до него)."""
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self.seek(values, backwards))
+        prefix = '' if backwards else '-'
+        ordering = [prefix + lookup for lookup in self.lookups]
+        return list(queryset.order_by(*ordering)[:limit])
+
+    def count_objects(self):
+        return self.object_list.count()
+
+    def values(self, obj):
+        return [getattr(obj, key) for key in self.keys]
+
+    def seek(self, values, backwards):
+        """Условие (a, b) < (x, y), развёрнутое в OR для любой СУБД.
+
+        Отдельная граница a <= x даёт СУБД диапазон по индексу,
+        иначе OR превращается в полный просмотр.
+        """
+        operator = 'gt' if backwards else 'lt'
+        condition = Q()
+        equal = {}
+        for lookup, value in zip(self.lookups, values):
+            condition |= Q(**equal, **{f'{lookup}__{operator}': value})
+            equal[lookup] = value
+        bound = {f'{self.lookups[0]}__{operator}e': values[0]}
+        return Q(**bound) & condition
+
+    def encode_cursor(self, direction, obj, number):
+        values = [str(getattr(obj, key)) for key in self.keys]
+        payload = json.dumps([direction, values, number])
+        return urlsafe_base64_encode(force_bytes(payload))
+
+    def decode_cursor(self, cursor):
+        """Разобрать курсор; испорченный курсор ведёт на первую страницу."""
+        if not cursor:
+            return NEXT, None, 1
+        try:
+            direction, raw, number = json.loads(urlsafe_base64_decode(cursor))
+            model = self.object_list.model
+            values = [
+                model._meta.get_field(lookup).to_python(value)
+                for lookup, value in zip(self.lookups, raw)
+            ]
+            number = int(number)
+        except (TypeError, ValueError, OverflowError, ValidationError,
+                FieldDoesNotExist):
+            return NEXT, None, 1
+        if (direction not in (NEXT, PREVIOUS) or number < 1
+                or len(values) != len(self.keys) or None in values):
+            return NEXT, None, 1
+        return direction, values, number
+
+
+def cached_count(paginator):
+    """Число записей выборки пагинатора из кэша по тексту запроса.
+
+    Точное число живёт до изменения постов (feed_version). Число больше
+    PAGINATOR_APPROX_COUNT отдаётся и после изменений, пока не истечёт
+    PAGINATOR_APPROX_TIMEOUT: пара новых постов его заметно не меняет.
+    Возвращает число и признак того, что оно приблизительное.
+    """
+    query = str(paginator.object_list.query)
+    key = f'posts:count:{hashlib.md5(query.encode()).hexdigest()}'
+    version = feed_version()
+    cached = cache.get(key)
+    if cached is not None:
+        count, counted = cached
+        if counted == version or count > settings.PAGINATOR_APPROX_COUNT:
+            return count, counted != version
+    count = paginator.count_objects()
+    timeout = (
+        settings.PAGINATOR_APPROX_TIMEOUT
+        if count > settings.PAGINATOR_APPROX_COUNT
+        else settings.FEED_CACHE_TIMEOUT
+    )
+    cache.set(key, (count, version), timeout)
+    return count, False
+
+
+class FeedPaginator(CursorPaginator):
+    """Курсорный пагинатор лент с номерами страниц вокруг текущей.
+
+    Шаблон получает page.page_links: первую страницу, по ON_EACH_SIDE
+    страниц с каждой стороны от текущей и пропуски между ними, а не
+    ссылку на каждую страницу. Курсоры страниц впереди берутся из того же
+    запроса с запасом, позади — из ещё одного короткого запроса по индексу.
+    Всего страниц — по числу из cached_count().
+    """
+
+    on_each_side = 2
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.pages_ahead = self.on_each_side + 1
+        # Число записей, если оно уже известно (счётчик автора)
+        self.known_count = count
+
+    def page(self, cursor):
+        page = super().page(cursor)
+        if self.known_count is None:
+            count, page.approximate = cached_count(self)
+        else:
+            count, page.approximate = self.known_count, False
+        page.page_links = self.page_links(page)
+        page.total_pages = max(
+            math.ceil(count / self.per_page), page.page_links[-1].number or 1
+        )
+        if page.total_pages > page.page_links[-1].number:
+            page.page_links.append(GAP)
+        return page
+
+    def page_links(self, page):
+        rows = list(page.object_list)
+        if not rows:
+            return [PageLink(page.number, None)]
+        before, after = self.neighbours(page, rows)
+        links = [
+            *self.previous_links(page, before),
+            PageLink(page.number, None),
+            *self.next_links(page, after),
+        ]
+        first = links[0].number
+        if first > 1:
+            links[:0] = [PageLink(1, '')] + ([GAP] if first > 2 else [])
+        return links
+
+    def neighbours(self, page, rows):
+        """Записи до и после страницы, ближайшие первыми."""
+        side = self.on_each_side
+        if self.backwards:
+            after = self.fetch(
+                self.values(rows[-1]), False, self.per_page * (side - 1) + 1
+            )
+            return self.beyond, after
+        before = self.fetch(
+            self.values(rows[0]), True, self.per_page * (side - 1)
+        ) if page.number > 2 else []
+        return before, self.beyond
+
+    def previous_links(self, page, before):
+        links = []
+        number = page.number
+        for k in range(1, min(self.on_each_side, number - 1) + 1):
+            if number - k == 1:
+                cursor = ''
+            elif k == 1:
+                cursor = page.previous_cursor
+            elif len(before) >= (k - 1) * self.per_page:
+                cursor = self.encode_cursor(
+                    PREVIOUS, before[(k - 1) * self.per_page - 1], number - k
+                )
+            else:
+                break
+            links.insert(0, PageLink(number - k, cursor))
+        return links
+
+    def next_links(self, page, after):
+        links = []
+        for k in range(1, self.on_each_side + 1):
+            if k == 1 and page.has_next():
+                cursor = page.next_cursor
+            elif k > 1 and len(after) > (k - 1) * self.per_page:
+                cursor = self.encode_cursor(
+                    NEXT, after[(k - 1) * self.per_page - 1], page.number + k
+                )
+            else:
+                break
+            links.append(PageLink(page.number + k, cursor))
+        return links
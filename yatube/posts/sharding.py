@@ -0,0 +1,265 @@
+import hashlib
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+from .models import (AuthorShard, Comment, CommentKey, Group, Post, PostKey,
+                     TimelineEntry, User)
+from .paginator import CursorPaginator, FeedPaginator
+
+# Модели, которые роутер направляет в шард автора поста
+ROUTED_MODELS = frozenset(('post', 'comment'))
+# TimelineEntry в шардах пустая: её таблица нужна каскадному удалению поста.
+SHARD_MODELS = ROUTED_MODELS | {'timelineentry'}
+# Поля пользователя, которые выводятся в карточках и комментариях
+USER_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def enabled():
+    return bool(settings.POST_SHARDS)
+
+
+def post_databases():
+    """Базы, в которых лежат посты: шарды или одна default."""
+    return list(settings.POST_SHARDS) or [DEFAULT_DB_ALIAS]
+
+
+def placement(author_id):
+    """Шард автора по rendezvous-хешированию.
+
+    При добавлении шарда в POST_SHARDS место меняет только
+    примерно 1/N авторов, а не почти все, как при author_id % N.
+    """
+    return max(settings.POST_SHARDS, key=lambda alias: hashlib.md5(
+        f'{alias}:{author_id}'.encode()
+    ).digest())
+
+
+def shard_for_author(author_id):
+    shard = AuthorShard.objects.filter(author_id=author_id).values_list(
+        'shard', flat=True
+    ).first()
+    return shard or placement(author_id)
+
+
+def shard_for_post(post_id):
+    """Шард поста или None, если такого поста нет."""
+    author_id = PostKey.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    return None if author_id is None else shard_for_author(author_id)
+
+
+def allocate_id(instance):
+    """Выдать новому посту или комментарию глобальный id."""
+    if isinstance(instance, Post):
+        AuthorShard.objects.get_or_create(
+            author_id=instance.author_id,
+            defaults={'shard': placement(instance.author_id)},
+        )
+        instance.pk = PostKey.objects.create(author_id=instance.author_id).pk
+    else:
+        instance.pk = CommentKey.objects.create().pk
+
+
+def get_post_or_404(queryset, post_id):
+    """Пост из его шарда с автором и группой из default."""
+    if not enabled():
+        return get_object_or_404(queryset, pk=post_id)
+    alias = shard_for_post(post_id)
+    if alias is None:
+        raise Http404('No Post matches the given query.')
+    post = get_object_or_404(
+        queryset.select_related(None).using(alias), pk=post_id
+    )
+    attach_related([post])
+    return post
+
+
+def attach_related(objects):
+    """Подставить авторов (и группы постов) из default.
+
+    Join между базами невозможен, поэтому связи страницы читаются
+    одним запросом на модель, а не запросом на объект.
+    """
+    if not objects:
+        return objects
+    model = type(objects[0])
+    related = [(model._meta.get_field('author'), User.objects.only(
+        *USER_FIELDS
+    ))]
+    if model is Post:
+        related.append((Post._meta.get_field('group'), Group.objects.all()))
+    for field, queryset in related:
+        ids = {getattr(obj, field.attname) for obj in objects} - {None}
+        found = queryset.in_bulk(ids) if ids else {}
+        for obj in objects:
+            field.set_cached_value(obj, found.get(getattr(obj, field.attname)))
+    return objects
+
+
+class ShardedPaginator(CursorPaginator):
+    """Scatter-gather по шардам: одна выборка в каждом шарде,
+    затем k-way слияние отсортированных страниц.
+
+    Каждый шард отдаёт не больше limit записей после курсора,
+    поэтому глубина страницы не зависит от числа шардов.
+    Шарды опрашиваются по очереди: соединения Django привязаны к потоку.
+    """
+
+    def __init__(self, object_list, per_page, databases=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.databases = (
+            post_databases() if databases is None else list(databases)
+        )
+
+    def fetch(self, values, backwards, limit):
+        sources = [
+            CursorPaginator(
+                self.object_list.using(alias), self.per_page,
+                self.keys, self.lookups,
+            ).fetch(values, backwards, limit)
+            for alias in self.databases
+        ]
+        merged = heapq.merge(
+            *sources,
+            key=lambda obj: tuple(getattr(obj, key) for key in self.keys),
+            reverse=not backwards,
+        )
+        return attach_related(list(islice(merged, limit)))
+
+    def count_objects(self):
+        return sum(
+            self.object_list.using(alias).count() for alias in self.databases
+        )
+
+
+class ShardedFeedPaginator(FeedPaginator, ShardedPaginator):
+    """Номера страниц FeedPaginator над scatter-gather выборкой."""
+
+
+def chunked(ids, size=500):
+    """id порциями: SQLite ограничивает число параметров запроса."""
+    ids = sorted(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def copy_rows(queryset, target, copied, posts=None):
+    """Скопировать в target строки queryset, которых ещё нет в copied.
+
+    posts — id уже скопированных постов: комментарии к остальным
+    ждут следующего прохода, чтобы не опередить свой пост.
+    Пополняет copied и возвращает число скопированных строк.
+    """
+    rows = queryset.values_list('pk', 'post_id' if posts is not None else 'pk')
+    pending = {
+        pk for pk, parent in rows
+        if pk not in copied and (posts is None or parent in posts)
+    }
+    with transaction.atomic(using=target):
+        for chunk in chunked(pending):
+            # raw: без auto_now и без сигналов счётчиков и лент.
+            for obj in queryset.filter(pk__in=chunk).order_by('pk'):
+                obj.save_base(raw=True, using=target, force_insert=True)
+    copied.update(pending)
+    return len(pending)
+
+
+def move_author(author_id, source, target):
+    """Перенести посты автора с комментариями из source в target.
+
+    Строки копируются с прежними id и датами, затем автор переключается
+    на target. Записи, успевшие попасть в source до переключения,
+    докопируются, и только после этого из source удаляются ровно
+    скопированные строки. Возвращает число перенесённых постов.
+    """
+    posts = Post.objects.using(source).filter(author_id=author_id)
+    comments = Comment.objects.using(source).filter(
+        post__author_id=author_id
+    )
+    post_ids, comment_ids = set(), set()
+    if source != target:
+        copy_rows(posts, target, post_ids)
+        copy_rows(comments, target, comment_ids, post_ids)
+    AuthorShard.objects.update_or_create(
+        author_id=author_id, defaults={'shard': target}
+    )
+    if source == target:
+        return 0
+    # После переключения новые записи идут в target: цикл сходится.
+    while (copy_rows(posts, target, post_ids)
+           + copy_rows(comments, target, comment_ids, post_ids)):
+        pass
+    # Посты, созданные до шардирования, получают ключи при переносе.
+    PostKey.objects.bulk_create(
+        [PostKey(pk=pk, author_id=author_id) for pk in post_ids],
+        ignore_conflicts=True,
+    )
+    CommentKey.objects.bulk_create(
+        [CommentKey(pk=pk) for pk in comment_ids], ignore_conflicts=True
+    )
+    with transaction.atomic(using=source):
+        for chunk in chunked(comment_ids):
+            Comment.objects.filter(pk__in=chunk)._raw_delete(source)
+        for chunk in chunked(post_ids):
+            if source == DEFAULT_DB_ALIAS:
+                # Ленты подписок есть только в default, в шардах они пусты.
+                TimelineEntry.objects.filter(
+                    post_id__in=chunk
+                )._raw_delete(source)
+            Post.objects.filter(pk__in=chunk)._raw_delete(source)
+    return len(post_ids)
+
+
+def delete_author(author_id):
+    """Удалить посты и комментарии пользователя во всех базах постов.
+
+    Каскад Django при удалении пользователя доходит только до default,
+    а оставшиеся в шардах строки ссылались бы на несуществующего автора.
+    """
+    for alias in post_databases():
+        Comment.objects.using(alias).filter(author_id=author_id).delete()
+        Post.objects.using(alias).filter(author_id=author_id).delete()
+    PostKey.objects.filter(author_id=author_id).delete()
+
+
+class ShardRouter:
+    """Посты и комментарии — в шард автора поста (POST_SHARDS).
+
+    Шард известен только по объекту из hints. Ленты читаются
+    через ShardedPaginator с явным using(); выборки без объекта
+    остаются следующему роутеру.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not enabled() or not self.routed(model):
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if instance._state.db in settings.POST_SHARDS:
+            return instance._state.db
+        if isinstance(instance, Post) and instance.author_id:
+            return shard_for_author(instance.author_id)
+        if isinstance(instance, Comment):
+            if Comment.post.is_cached(instance):
+                return self.db_for_read(Post, instance=instance.post)
+            return shard_for_post(instance.post_id)
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.POST_SHARDS:
+            return app_label == 'posts' and model_name in SHARD_MODELS
+        return None
+
+    @staticmethod
+    def routed(model):
+        return (model._meta.app_label == 'posts'
+                and model._meta.model_name in ROUTED_MODELS)
@@ -0,0 +1,125 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, image_meta, lookups, sharding, timeline
+from .cache import bump_feed_version, bump_object_version
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+# Поля пользователя, которые выводятся в лентах
+USER_FEED_FIELDS = frozenset(('username', 'first_name', 'last_name'))
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+def id_allocated(sender, instance, raw=False, **kwargs):
+    if instance.pk is None and not raw and sharding.enabled():
+        sharding.allocate_id(instance)
+
+
+@receiver(pre_save, sender=Post)
+def image_described(sender, instance, raw=False, update_fields=None,
+                    **kwargs):
+    if not raw and (update_fields is None or 'image' in update_fields):
+        image_meta.refresh(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump(instance.author_id, posts_count=1)
+        if not sharding.enabled():
+            timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_comments(instance.post_id, 1, instance._state.db)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1, instance._state.db)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump(instance.author_id, followers_count=1)
+        counters.bump(instance.user_id, following_count=1)
+        if not sharding.enabled():
+            timeline.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump(instance.author_id, followers_count=-1)
+    counters.bump(instance.user_id, following_count=-1)
+    timeline.purge(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def feed_changed(sender, raw=False, **kwargs):
+    if not raw:
+        bump_feed_version()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_object_version(f'group:{instance.pk}')
+        bump_feed_version()
+        lookups.groups.invalidate()
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    if sharding.enabled():
+        sharding.delete_author(instance.pk)
+
+
+def feed_fields(user):
+    return tuple(getattr(user, name) for name in sorted(USER_FEED_FIELDS))
+
+
+@receiver(pre_save, sender=User)
+def user_changing(sender, instance, update_fields=None, raw=False,
+                  **kwargs):
+    """Запомнить, меняются ли поля пользователя, которые видны в лентах."""
+    # Вход пользователя сохраняет только last_login: ленты не меняются.
+    if (raw or instance.pk is None
+            or update_fields and not USER_FEED_FIELDS & set(update_fields)):
+        instance._feed_fields_changed = False
+        return
+    stored = User.objects.filter(pk=instance.pk).values_list(
+        *sorted(USER_FEED_FIELDS)
+    ).first()
+    instance._feed_fields_changed = stored != feed_fields(instance)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, raw=False, **kwargs):
+    # Нового пользователя ещё нет ни в одной ленте.
+    if raw or created or not instance._feed_fields_changed:
+        return
+    user_invalidated(sender, instance)
+
+
+@receiver(post_delete, sender=User)
+def user_invalidated(sender, instance, **kwargs):
+    bump_object_version(f'user:{instance.pk}')
+    bump_feed_version()
+    lookups.users.invalidate()
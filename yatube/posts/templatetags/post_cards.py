@@ -0,0 +1,35 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.cache import card_cache_key
+from posts.cache import prefetch_cards as prefetch
+from posts.thumbnails import ready
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_cards(posts):
+    """Загрузить карточки всей страницы ленты одним обращением к кэшу."""
+    prefetch(posts)
+    return ''
+
+
+@register.simple_tag
+def post_card(post):
+    """Карточка поста из кэша; рендерится заново только после правки.
+
+    Карточка с заглушкой вместо ещё не готовых миниатюр не кэшируется.
+    """
+    if not hasattr(post, '_card'):
+        prefetch([post])
+    stamp, html = post._card
+    if html is None:
+        html = render_to_string('includes/card_posts.html', {'post': post})
+        if not post.image or ready(post):
+            cache.set(card_cache_key(post), (stamp, html),
+                      settings.FEED_CACHE_TIMEOUT)
+    return mark_safe(html)
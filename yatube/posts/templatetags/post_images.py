@@ -0,0 +1,79 @@
+from django import template
+from django.conf import settings
+
+from posts.thumbnails import (for_post, lookup, prefetch, ready,
+                              thumbnail_size, variant_formats, variant_name)
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(image, preset='card'):
+    """Готовая миниатюра пресета или None.
+
+    В отличие от {% thumbnail %} не открывает оригинал и не создаёт
+    миниатюру во время рендера: их создаёт пул posts.thumbnails.
+    """
+    return lookup(image, preset)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, *names):
+    """Загрузить миниатюры всей страницы ленты одним обращением.
+
+    Без пресетов загружаются все, включая варианты для <picture>.
+    """
+    prefetch(posts, list(names) or None)
+    return ''
+
+
+@register.simple_tag
+def post_thumbnail(post, preset='card'):
+    """Миниатюра поста из prefetch_thumbnails или отдельным запросом."""
+    return for_post(post, preset)
+
+
+def srcset(post, image_format):
+    files = [
+        for_post(post, variant_name(image_format, width))
+        for width in settings.POST_IMAGE_VARIANTS['widths']
+    ]
+    # Ширины, которых не хватило оригиналу, совпадают: оставляем первую.
+    widths = {}
+    for im in files:
+        widths.setdefault(im.x, im.url)
+    return ', '.join(f'{url} {width}w' for width, url in widths.items())
+
+
+@register.simple_tag
+def card_size(post):
+    """Ширина и высота карточки из полей поста, без обращения к файлам."""
+    return thumbnail_size(post, 'card')
+
+
+@register.simple_tag
+def post_picture(post):
+    """Данные <picture> поста или None, пока готовы не все варианты.
+
+    sources — варианты форматов по убыванию предпочтения, img — карточка,
+    srcset — запасной формат. width и height берутся из полей поста,
+    а для постов до backfill_image_meta — из записи миниатюры.
+    """
+    if not post.image or not ready(post):
+        return None
+    sources = [
+        {'type': f'image/{image_format.lower()}',
+         'srcset': srcset(post, image_format)}
+        for image_format in variant_formats()
+    ]
+    fallback = sources.pop() if sources else {'srcset': ''}
+    img = for_post(post, 'card')
+    width, height = thumbnail_size(post, 'card') or (img.x, img.y)
+    return {
+        'img': img,
+        'width': width,
+        'height': height,
+        'sources': sources,
+        'srcset': fallback['srcset'],
+        'sizes': settings.POST_IMAGE_VARIANTS['sizes'],
+    }
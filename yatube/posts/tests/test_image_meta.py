@@ -0,0 +1,100 @@
+import hashlib
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import thumbnails
+from ..models import Post, User
+from .test_thumbnails import SMALL_GIF, uploaded
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, POST_THUMBNAIL_WORKERS=0)
+class ImageMetaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='meta')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user, text='С картинкой', image=uploaded()
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_filled_on_upload(self):
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(SMALL_GIF))
+        self.assertEqual(post.image_hash,
+                         hashlib.sha256(SMALL_GIF).hexdigest())
+
+    def test_cleared_with_image(self):
+        self.post.image = None
+        self.post.save()
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_hash, '')
+
+    def test_size_without_file_access(self):
+        """Размер карточки считается как у sorl, без чтения файла."""
+        thumbnails.generate(self.post.image.name)
+        card = thumbnails.lookup(self.post.image, 'card')
+        with mock.patch('django.core.files.storage.FileSystemStorage.open',
+                        side_effect=AssertionError):
+            post = Post.objects.feed().get(pk=self.post.pk)
+            with self.assertNumQueries(0):
+                size = thumbnails.thumbnail_size(post)
+        self.assertEqual(size, (card.x, card.y))
+
+    def test_placeholder_keeps_card_proportions(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+
+    def test_backfill(self):
+        Post.objects.filter(pk=self.post.pk).update(
+            image_width=None, image_height=None, image_size=None,
+            image_hash='',
+        )
+        gone = Post.objects.create(
+            author=self.user, text='Без файла', image=uploaded('gone.gif')
+        )
+        Post.objects.filter(pk=gone.pk).update(image_hash='')
+        gone.image.storage.delete(gone.image.name)
+        broken = Post.objects.create(
+            author=self.user, text='Битый файл', image=uploaded('broken.gif')
+        )
+        Post.objects.filter(pk=broken.pk).update(image_hash='')
+        with broken.image.storage.open(broken.image.name, 'wb') as file:
+            file.write(b'not an image')
+        out, err = StringIO(), StringIO()
+        with mock.patch(
+            'posts.management.commands.backfill_image_meta.make_pool',
+            ThreadPoolExecutor,
+        ):
+            call_command('backfill_image_meta', '--workers', '2',
+                         stdout=out, stderr=err)
+        self.assertIn('Заполнено картинок: 1, файлов не найдено: 1, '
+                      'не прочитано: 1', out.getvalue())
+        self.assertIn('gone.gif', err.getvalue())
+        self.assertIn('broken.gif: файл не читается', err.getvalue())
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(SMALL_GIF))
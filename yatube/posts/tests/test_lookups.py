@@ -0,0 +1,71 @@
+from django.core.cache import cache
+from django.http import Http404
+from django.test import TestCase
+
+from ..cache import feed_version
+from ..lookups import TwoLevelLookup, groups
+from ..models import Group, User
+
+
+class TwoLevelLookupTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_cached_lookup(self):
+        """Повторный поиск группы не обращается к базе."""
+        self.assertEqual(groups.get_or_404('test-slug'), self.group)
+        with self.assertNumQueries(0):
+            group = groups.get_or_404('test-slug')
+        self.assertEqual(group.title, self.group.title)
+
+    def test_missing(self):
+        with self.assertRaises(Http404):
+            groups.get_or_404('missing')
+
+    def test_rename_seen_by_other_workers(self):
+        """Переименование видно и в памяти другого процесса."""
+        worker = TwoLevelLookup(Group, 'slug', ('id', 'title', 'slug'))
+        worker.get_or_404('test-slug')
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertEqual(worker.get_or_404('test-slug').title,
+                         'Новое название')
+
+    def test_local_size_is_bounded(self):
+        """В памяти процесса держится не больше size записей."""
+        Group.objects.create(title='Вторая', slug='second', description='')
+        lookup = TwoLevelLookup(Group, 'slug', ('id', 'slug'), size=1)
+        lookup.get_or_404('test-slug')
+        lookup.get_or_404('second')
+        self.assertEqual(list(lookup._local), ['second'])
+
+
+class UserChangesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_only_name_changes_invalidate_feeds(self):
+        """Регистрация и сохранение без смены имени не сбрасывают ленты."""
+        version = feed_version()
+        user = User.objects.create_user(username='newcomer')
+        user.email = 'newcomer@example.com'
+        user.save()
+        self.assertEqual(feed_version(), version)
+        user.first_name = 'Новичок'
+        user.save()
+        self.assertNotEqual(feed_version(), version)
@@ -2,7 +2,8 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..counters import reconcile
+from ..models import AuthorStats, Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -28,3 +29,46 @@ class PostModelTest(TestCase):
         group = PostModelTest.group
         self.assertEqual(str(self.group), group.title)
         self.assertEqual(str(self.post), post.text[:settings.COUNT_POSTS])
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_reconcile_fixes_drift(self):
+        """reconcile() возвращает счётчики к реальным значениям."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        AuthorStats.objects.filter(user=self.author).update(posts_count=7)
+        Post.objects.filter(pk=post.pk).update(comments_count=3)
+        self.assertEqual(reconcile(), (1, 1))
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
@@ -0,0 +1,172 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from ..models import Group, Post, User
+from ..paginator import GAP, CursorPaginator, FeedPaginator
+
+POSTS_TOTAL = 13
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Paginator')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(POSTS_TOTAL)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_pages_follow_each_other(self):
+        """Курсоры ведут на следующую и обратно на предыдущую страницу."""
+        paginator = CursorPaginator(Post.objects.all(), settings.NUMBER_POSTS)
+        first = paginator.get_page(None)
+        self.assertEqual(len(first), settings.NUMBER_POSTS)
+        self.assertTrue(first.has_next())
+        self.assertFalse(first.has_previous())
+
+        second = paginator.get_page(first.next_cursor)
+        self.assertEqual(second.number, 2)
+        self.assertEqual(len(second), POSTS_TOTAL - settings.NUMBER_POSTS)
+        self.assertFalse(second.has_next())
+        self.assertFalse(
+            set(p.pk for p in first) & set(p.pk for p in second)
+        )
+
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual(back.number, 1)
+        self.assertEqual([p.pk for p in back], [p.pk for p in first])
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        paginator = CursorPaginator(Post.objects.all(), settings.NUMBER_POSTS)
+        page = paginator.get_page('not-a-cursor')
+        self.assertEqual(page.number, 1)
+        self.assertEqual(len(page), settings.NUMBER_POSTS)
+
+    def test_infinite_page_number_returns_first_page(self):
+        """Номер страницы Infinity в курсоре не роняет ленту."""
+        cursor = urlsafe_base64_encode(force_bytes(
+            '["n", ["2020-01-01 00:00:00+00:00", "1"], Infinity]'
+        ))
+        response = self.client.get(reverse('posts:index'),
+                                   {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_feeds_count_once(self):
+        """Ленты не выполняют OFFSET, а COUNT(*) — раз на запрос ленты."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                    self.client.get(
+                        url, {'cursor': response.context['page_obj']
+                              .next_cursor}
+                    )
+                counts = [query for query in queries
+                          if 'COUNT(' in query['sql']]
+                self.assertLessEqual(len(counts), 1)
+                for query in queries:
+                    self.assertNotIn('OFFSET', query['sql'])
+
+
+class FeedPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='Feed')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user)
+            for i in range(POSTS_TOTAL)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def paginator(self):
+        return FeedPaginator(Post.objects.feed(), 2)
+
+    @staticmethod
+    def numbers(page):
+        return [link.number for link in page.page_links]
+
+    def test_elided_window(self):
+        """Ссылки только на первую страницу и соседей текущей."""
+        first = self.paginator().get_page(None)
+        self.assertEqual(self.numbers(first), [1, 2, 3, None])
+        self.assertEqual(first.total_pages, 7)
+        third = self.paginator().get_page(first.page_links[2].cursor)
+        self.assertEqual(self.numbers(third), [1, 2, 3, 4, 5, None])
+        fifth = self.paginator().get_page(third.page_links[4].cursor)
+        self.assertEqual(fifth.number, 5)
+        self.assertEqual(self.numbers(fifth), [1, None, 3, 4, 5, 6, 7])
+        self.assertIs(fifth.page_links[1], GAP)
+        back = self.paginator().get_page(fifth.page_links[2].cursor)
+        self.assertEqual(back.number, 3)
+        self.assertEqual([p.pk for p in back], [p.pk for p in third])
+        self.assertEqual(self.numbers(back), [1, 2, 3, 4, 5, None])
+
+    @override_settings(NUMBER_POSTS=2)
+    def test_profile_without_stats(self):
+        """Автор без AuthorStats (bulk_create, loaddata) не роняет
+        профиль: число страниц считается запросом."""
+        User.objects.bulk_create([User(username='nostats')])
+        author = User.objects.get(username='nostats')
+        Post.objects.bulk_create(
+            Post(text=f'Без счётчика {i}', author=author) for i in range(3)
+        )
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'nostats'})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].total_pages, 2)
+
+    def test_count_cached_until_feed_changes(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.paginator().get_page(None)
+            self.paginator().get_page(None)
+        self.assertEqual(
+            sum('COUNT(' in query['sql'] for query in queries), 1
+        )
+        Post.objects.create(text='Новый', author=self.user)
+        page = self.paginator().get_page(None)
+        self.assertEqual(page.total_pages, 7)
+        self.assertFalse(page.approximate)
+
+    @override_settings(PAGINATOR_APPROX_COUNT=5)
+    def test_large_count_approximate(self):
+        """Большое число не пересчитывается после каждого поста."""
+        self.paginator().get_page(None)
+        Post.objects.create(text='Новый', author=self.user)
+        Post.objects.create(text='Ещё', author=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            page = self.paginator().get_page(None)
+        self.assertTrue(page.approximate)
+        self.assertEqual(page.total_pages, 7)
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries))
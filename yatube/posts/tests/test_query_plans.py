@@ -0,0 +1,75 @@
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+class QueryPlanTests(TestCase):
+    """Запросы лент идут по индексам: без полного просмотра и сортировки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(15):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            )
+        cls.post = post
+        Comment.objects.create(post=post, author=cls.reader, text='Текст')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def tearDown(self):
+        cache.clear()
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+            page_obj = response.context.get('page_obj')
+            if page_obj is not None and page_obj.has_next():
+                self.client.get(url, {'cursor': page_obj.next_cursor})
+        # CaptureQueriesContext хранит SQL с подставленными параметрами.
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            for step in self.plan(sql):
+                with self.subTest(url=url, sql=sql):
+                    self.assertNotRegex(step, FULL_SCAN)
+                    self.assertNotIn(TEMP_SORT, step)
+
+    def test_feed_queries_use_indexes(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            self.assert_indexed(url)
@@ -0,0 +1,242 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import AuthorShard, Comment, Follow, Group, Post, PostKey, User
+from .. import sharding
+from ..sharding import ShardRouter, placement
+
+SHARDS = ['shard_a', 'shard_b']
+
+
+def add_shard(alias):
+    """Локальный шард SQLite в памяти на время тестов класса."""
+    connections.databases[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+    connections.ensure_defaults(alias)
+    connections.prepare_test_settings(alias)
+    with override_settings(POST_SHARDS=SHARDS):
+        call_command('migrate', 'posts', database=alias, verbosity=0)
+
+
+def remove_shard(alias):
+    del connections.databases[alias]
+    delattr(connections._connections, alias)
+
+
+@override_settings(POST_SHARDS=SHARDS, NUMBER_POSTS=4)
+class ShardedTestCase(TestCase):
+    databases = {'default', *SHARDS}
+
+    @classmethod
+    def setUpClass(cls):
+        for alias in SHARDS:
+            add_shard(alias)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in SHARDS:
+            remove_shard(alias)
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    @staticmethod
+    def texts(response):
+        return [post.text for post in response.context['page_obj']]
+
+
+class ShardedViewsTests(ShardedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Группа', slug='sharded', description='Описание'
+        )
+        cls.left = User.objects.create_user(username='left')
+        cls.right = User.objects.create_user(username='right')
+        AuthorShard.objects.create(author=cls.left, shard='shard_a')
+        AuthorShard.objects.create(author=cls.right, shard='shard_b')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.left if i % 2 == 0 else cls.right,
+                text=f'Пост {i}',
+                group=cls.group,
+            )
+            for i in range(6)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.right)
+
+    def test_posts_stored_in_author_shard(self):
+        self.assertEqual(
+            Post.objects.using('shard_a').filter(author=self.left).count(), 3
+        )
+        self.assertEqual(
+            Post.objects.using('shard_b').filter(author=self.right).count(), 3
+        )
+        self.assertFalse(Post.objects.using('default').exists())
+        self.assertEqual(PostKey.objects.count(), 6)
+
+    def test_index_merges_shards(self):
+        """Главная — k-way слияние страниц всех шардов по дате."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            self.texts(response), ['Пост 5', 'Пост 4', 'Пост 3', 'Пост 2']
+        )
+        self.assertEqual(response.context['page_obj'][0].author, self.right)
+        cursor = response.context['page_obj'].next_cursor
+        response = self.client.get(reverse('posts:index'), {'cursor': cursor})
+        self.assertEqual(self.texts(response), ['Пост 1', 'Пост 0'])
+
+    def test_group_and_profile(self):
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'sharded'})
+        )
+        self.assertEqual(len(self.texts(response)), 4)
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'left'})
+        )
+        self.assertEqual(self.texts(response), ['Пост 4', 'Пост 2', 'Пост 0'])
+
+    def test_comment_stored_with_post(self):
+        post = self.posts[0]
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'Комментарий'},
+        )
+        comment = Comment.objects.using('shard_a').get()
+        self.assertEqual(comment.author_id, self.right.pk)
+        self.assertEqual(
+            Post.objects.using('shard_a').get(pk=post.pk).comments_count, 1
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertEqual(response.context['post'].author, self.left)
+        comments = list(response.context['comments'])
+        self.assertEqual([c.text for c in comments], ['Комментарий'])
+        self.assertEqual(comments[0].author, self.right)
+
+    def test_delete_cascades_in_shard(self):
+        post = Post.objects.using('shard_a').get(pk=self.posts[0].pk)
+        Comment.objects.create(post=post, author=self.right, text='К')
+        post.delete()
+        self.assertEqual(Post.objects.using('shard_a').count(), 2)
+        self.assertFalse(Comment.objects.using('shard_a').exists())
+
+    def test_follow_index_gathers_shards(self):
+        Follow.objects.create(user=self.right, author=self.left)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(self.texts(response), ['Пост 4', 'Пост 2', 'Пост 0'])
+
+    def test_user_deleted_in_all_shards(self):
+        """Посты и комментарии удалённого пользователя не остаются
+        в шардах и не ломают ленты."""
+        Comment.objects.create(post=self.posts[1], author=self.left, text='Л')
+        Comment.objects.create(post=self.posts[0], author=self.right, text='П')
+        self.left.delete()
+        self.assertFalse(Post.objects.using('shard_a').exists())
+        self.assertFalse(Comment.objects.using('shard_a').exists())
+        self.assertFalse(Comment.objects.using('shard_b').exists())
+        self.assertEqual(Post.objects.using('shard_b').get(
+            pk=self.posts[1].pk
+        ).comments_count, 0)
+        self.assertFalse(PostKey.objects.filter(
+            author_id=self.left.pk
+        ).exists())
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(self.texts(response), ['Пост 5', 'Пост 3', 'Пост 1'])
+
+    def test_unknown_post(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': 10 ** 6})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class RebalanceTests(ShardedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+
+    def rebalance(self, *args):
+        call_command('rebalance_shards', *args, stdout=StringIO())
+
+    def test_legacy_posts_moved_from_default(self):
+        with override_settings(POST_SHARDS=[]):
+            post = Post.objects.create(author=self.author, text='Старый')
+            Comment.objects.create(post=post, author=self.author, text='К')
+        self.rebalance()
+        shard = placement(self.author.pk)
+        moved = Post.objects.using(shard).get(pk=post.pk)
+        self.assertEqual(moved.pub_date, post.pub_date)
+        self.assertEqual(Comment.objects.using(shard).get().post_id, post.pk)
+        self.assertFalse(Post.objects.using('default').exists())
+        self.assertFalse(Comment.objects.using('default').exists())
+        self.assertEqual(PostKey.objects.get(pk=post.pk).author_id,
+                         self.author.pk)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, 'Старый')
+
+    def test_author_moved_between_shards(self):
+        AuthorShard.objects.create(author=self.author, shard='shard_a')
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.author, text='К')
+        self.rebalance('--author', str(self.author.pk), '--to', 'shard_b')
+        self.assertFalse(Post.objects.using('shard_a').exists())
+        self.assertFalse(Comment.objects.using('shard_a').exists())
+        self.assertEqual(
+            Post.objects.using('shard_b').get().pub_date, post.pub_date
+        )
+        self.assertEqual(AuthorShard.objects.get().shard, 'shard_b')
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'author'})
+        )
+        self.assertEqual(self.texts(response), ['Пост'])
+
+    def test_writes_during_move_not_lost(self):
+        """Комментарий, записанный в source до переключения автора,
+        докопируется, а не удаляется вместе с перенесёнными строками."""
+        AuthorShard.objects.create(author=self.author, shard='shard_a')
+        post = Post.objects.create(author=self.author, text='Пост')
+        copy_rows = sharding.copy_rows
+        late = []
+
+        def comment_before_switch(queryset, target, copied, posts=None):
+            copied_now = copy_rows(queryset, target, copied, posts)
+            if posts is not None and not late:
+                late.append(Comment.objects.using('shard_a').create(
+                    post=post, author=self.author, text='Поздний'
+                ))
+            return copied_now
+
+        with mock.patch.object(sharding, 'copy_rows',
+                               side_effect=comment_before_switch):
+            self.rebalance('--author', str(self.author.pk), '--to', 'shard_b')
+        self.assertFalse(Comment.objects.using('shard_a').exists())
+        self.assertEqual(
+            Comment.objects.using('shard_b').get().pk, late[0].pk
+        )
+
+    def test_migrations_only_sharded_tables(self):
+        router = ShardRouter()
+        self.assertTrue(router.allow_migrate('shard_a', 'posts', 'post'))
+        self.assertFalse(router.allow_migrate('shard_a', 'posts', 'follow'))
+        self.assertFalse(router.allow_migrate('shard_a', 'auth', 'user'))
+        self.assertIsNone(router.allow_migrate('default', 'posts', 'post'))
@@ -0,0 +1,218 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default
+
+from .. import thumbnails
+from ..cache import card_cache_key
+from ..models import Post, User
+from ..templatetags.post_cards import post_card
+from ..templatetags.post_images import post_picture
+
+MEDIA_ROOT = tempfile.mkdtemp()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+PLACEHOLDER = 'Изображение обрабатывается'
+
+
+def uploaded(name='small.gif'):
+    return SimpleUploadedFile(name, SMALL_GIF, content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, POST_THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='thumbs')
+        self.client.force_login(self.user)
+        self.post = Post.objects.create(
+            author=self.user, text='С картинкой', image=uploaded()
+        )
+        self.url = reverse('posts:post_detail', args=(self.post.pk,))
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_placeholder_until_generated(self):
+        """Пока миниатюры нет, выводится заглушка, а не ресайз в рендере."""
+        with mock.patch('sorl.thumbnail.base.ThumbnailBackend.'
+                        '_create_thumbnail') as create:
+            response = self.client.get(self.url)
+            self.client.get(reverse('posts:index'))
+        create.assert_not_called()
+        self.assertContains(response, PLACEHOLDER)
+
+        thumbnails.generate(self.post.image.name)
+        thumbnail = thumbnails.lookup(self.post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(self.url)
+        self.assertNotContains(response, PLACEHOLDER)
+        self.assertContains(response, thumbnail.url)
+
+    def test_card_with_placeholder_not_cached(self):
+        post_card(self.post)
+        self.assertIsNone(cache.get(card_cache_key(self.post)))
+        thumbnails.generate(self.post.image.name)
+        post_card(Post.objects.get(pk=self.post.pk))
+        self.assertIsNotNone(cache.get(card_cache_key(self.post)))
+
+    def test_create_enqueues_thumbnails(self):
+        """Миниатюры создаются после сохранения поста с картинкой."""
+        with mock.patch('posts.thumbnails.transaction.on_commit',
+                        side_effect=lambda func: func()):
+            self.client.post(reverse('posts:post_create'), {
+                'text': 'Новый', 'image': uploaded('new.gif'),
+            })
+        post = Post.objects.get(text='Новый')
+        self.assertIsNotNone(thumbnails.lookup(post.image, 'card'))
+
+    @override_settings(POST_THUMBNAIL_WORKERS=2)
+    def test_submitted_to_pool(self):
+        with mock.patch('posts.thumbnails.pool') as pool:
+            thumbnails.submit('posts/small.gif')
+        pool().submit.assert_called_once_with(
+            thumbnails.generate, 'posts/small.gif'
+        )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, POST_THUMBNAIL_WORKERS=0)
+class PrefetchThumbnailTests(TestCase):
+    POSTS_TOTAL = 3
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='gallery')
+        for i in range(cls.POSTS_TOTAL):
+            post = Post.objects.create(
+                author=cls.user, text=f'Картинка {i}',
+                image=uploaded(f'page_{i}.gif'),
+            )
+            thumbnails.generate(post.image.name)
+        Post.objects.create(author=cls.user, text='Без картинки')
+
+    @classmethod
+    def tearDownClass(cls):
+        Post.objects.all().delete()
+        cls.user.delete()
+        default.kvstore.clear()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_one_query_for_page(self):
+        """Промахи кэша страницы дочитываются из базы одним запросом."""
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(1):
+            found = thumbnails.prefetch(posts)
+        self.assertEqual(len(found), self.POSTS_TOTAL)
+        with self.assertNumQueries(0):
+            thumbnails.prefetch(posts)
+        for post in found:
+            self.assertEqual(
+                thumbnails.for_post(post).url,
+                thumbnails.lookup(post.image, 'card').url,
+            )
+
+    def test_feed_reads_prefetched_map(self):
+        """Карточки ленты не обращаются к хранилищу sorl по одной."""
+        with mock.patch(
+            'sorl.thumbnail.kvstores.cached_db_kvstore.KVStore._get_raw',
+            side_effect=AssertionError,
+        ), mock.patch.object(
+            thumbnails, 'get_raw_many', wraps=thumbnails.get_raw_many
+        ) as get_many:
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(get_many.call_count, 1)
+        self.assertNotContains(response, PLACEHOLDER)
+
+    def test_missing_thumbnail_not_cached(self):
+        """Заглушка сменяется миниатюрой, созданной другим процессом."""
+        post = Post.objects.create(
+            author=self.user, text='Новая', image=uploaded('late.gif')
+        )
+        self.assertIsNone(thumbnails.lookup(post.image, 'card'))
+        with mock.patch.object(default.kvstore.cache, 'set'):
+            thumbnails.generate(post.image.name)
+        self.assertIsNotNone(thumbnails.lookup(post.image, 'card'))
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT, POST_THUMBNAIL_WORKERS=0,
+    POST_IMAGE_VARIANTS={
+        'widths': (2, 4, 8),
+        'aspect': (2, 1),
+        'formats': ('AVIF', 'WEBP', 'JPEG'),
+        'sizes': '100vw',
+    },
+)
+class PictureTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='picture')
+        self.post = Post.objects.create(
+            author=self.user, text='Варианты', image=uploaded('wide.gif')
+        )
+
+    def tearDown(self):
+        cache.clear()
+        default.kvstore.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_unsupported_formats_skipped(self):
+        with mock.patch.object(thumbnails, 'saveable',
+                               side_effect=lambda fmt: fmt != 'AVIF'):
+            names = list(thumbnails.presets())
+        self.assertEqual(names, [
+            'card', 'webp-2', 'webp-4', 'webp-8',
+            'jpeg-2', 'jpeg-4', 'jpeg-8',
+        ])
+        self.assertEqual(
+            thumbnails.presets()['jpeg-8'],
+            ('8x4', {'crop': 'center', 'upscale': False, 'format': 'JPEG'}),
+        )
+
+    def test_picture_after_all_variants(self):
+        """<picture> выводится, когда готовы все варианты, с размерами."""
+        with mock.patch.object(thumbnails, 'variant_formats',
+                               return_value=['JPEG']):
+            self.assertIsNone(post_picture(self.post))
+            thumbnails.generate(self.post.image.name)
+            post = Post.objects.get(pk=self.post.pk)
+            picture = post_picture(post)
+            response = self.client.get(
+                reverse('posts:post_detail', args=(post.pk,))
+            )
+        jpeg = thumbnails.lookup(post.image, 'jpeg-2')
+        self.assertTrue(jpeg.url.endswith('.jpg'))
+        # Оригинал 2x1 не увеличивается: все ширины дают файл ширины 2.
+        self.assertEqual(picture['srcset'], f'{jpeg.url} 2w')
+        self.assertEqual(picture['sources'], [])
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, f'width="{picture["img"].x}"')
+        self.assertContains(response, 'loading="lazy"')
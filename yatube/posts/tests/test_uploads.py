@@ -0,0 +1,141 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, JpegImagePlugin
+
+from core.uploads import OversizedUpload
+
+from ..models import Post, User
+from .test_thumbnails import SMALL_GIF, uploaded
+
+MEDIA_ROOT = tempfile.mkdtemp()
+EXIF_ORIENTATION = 0x0112
+
+
+def jpeg(size=(400, 200), orientation=None):
+    """JPEG с EXIF: ориентацией и строкой модели камеры."""
+    exif = Image.Exif()
+    exif[0x0110] = 'Camera'
+    if orientation:
+        exif[EXIF_ORIENTATION] = orientation
+    output = BytesIO()
+    Image.new('RGB', size, 'red').save(output, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile('photo.jpg', output.getvalue(),
+                              content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, POST_THUMBNAIL_WORKERS=0,
+                   POST_IMAGE_MAX_SIDE=100)
+class UploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def create(self, image):
+        return self.client.post(reverse('posts:post_create'), {
+            'text': 'Загрузка', 'image': image,
+        })
+
+    def test_normalized_on_upload(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет EXIF."""
+        decoder = JpegImagePlugin.JpegImageFile
+        with mock.patch.object(decoder, 'draft', autospec=True,
+                               side_effect=decoder.draft) as draft:
+            self.create(jpeg(size=(1600, 800), orientation=6))
+        draft.assert_called()
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/photo.jpg')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (50, 100))
+            self.assertEqual(dict(image.getexif()), {})
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+
+    def test_gif_keeps_name_and_format(self):
+        self.create(uploaded('keep.gif'))
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/keep.gif')
+        with Image.open(post.image.path) as image:
+            self.assertEqual((image.format, image.size), ('GIF', (2, 1)))
+
+    def test_unwritable_format_rejected(self):
+        """Формат, который Pillow только читает, отклоняется формой."""
+        xpm = SimpleUploadedFile('icon.xpm', (
+            b'/* XPM */\nstatic char *icon[] = {\n"2 2 1 1",\n'
+            b'"a c #FF0000",\n"aa",\n"aa"};\n'
+        ), content_type='image/x-xpixmap')
+        response = self.create(xpm)
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(response, 'form', 'image',
+                             'Формат XPM не поддерживается.')
+
+    def test_animation_resized_and_stripped(self):
+        frames = [Image.new('P', (300, 150), color) for color in (1, 2)]
+        output = BytesIO()
+        frames[0].save(output, 'GIF', save_all=True,
+                       append_images=frames[1:], duration=[70, 90],
+                       loop=3, comment=b'secret')
+        self.create(SimpleUploadedFile('moving.gif', output.getvalue(),
+                                       content_type='image/gif'))
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/moving.gif')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertEqual(image.n_frames, 2)
+            self.assertEqual(image.info['loop'], 3)
+            self.assertEqual(image.info['duration'], 70)
+            self.assertNotIn('comment', image.info)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1)
+    def test_pixel_limit_before_decoding(self):
+        with mock.patch.object(Image.Image, 'load',
+                               side_effect=AssertionError):
+            response = self.create(uploaded())
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(response, 'form', 'image',
+                             'Картинка больше 0 мегапикселей.')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=300 * 150 * 10)
+    def test_frames_count_towards_pixel_limit(self):
+        """Кадры анимации складываются в лимит без их декодирования."""
+        frames = [Image.new('P', (300, 150), color) for color in range(11)]
+        output = BytesIO()
+        frames[0].save(output, 'GIF', save_all=True,
+                       append_images=frames[1:])
+        with mock.patch.object(Image.Image, 'load',
+                               side_effect=AssertionError):
+            response = self.create(SimpleUploadedFile(
+                'long.gif', output.getvalue(), content_type='image/gif'
+            ))
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(response, 'form', 'image',
+                             'Картинка больше 0 мегапикселей.')
+
+    @override_settings(UPLOAD_MAX_BYTES=20)
+    def test_byte_limit_while_streaming(self):
+        """Файл сверх лимита не сохраняется целиком и отклоняется."""
+        response = self.create(uploaded())
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(response, 'form', 'image',
+                             'Файл больше 20\xa0байт.')
+        upload = response.context['form'].files['image']
+        self.assertIsInstance(upload, OversizedUpload)
+        self.assertEqual(upload.size, len(SMALL_GIF))
@@ -1,10 +1,21 @@
 
+from unittest import mock
+
 from django import forms
+from django.conf import settings
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_cache_key
+
+from core.metrics import REGISTRY
 
-from ..models import Comment, Follow, Group, Post, User
+from ..cache import feed_cache_stats
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+from ..timeline import PULL_AUTHORS_KEY
 
 
 class PostPagesTests(TestCase):
@@ -148,13 +159,23 @@ class PostPagesTests(TestCase):
         self.assertTrue(comment_text, 'Тестовый текст')
 
     def test_cache_index(self):
+        """Главная берётся из кэша, пока ленты не изменились."""
+        cache.clear()
+        response = self.guest_client.get(self.reverse_names[0])
+        with self.assertNumQueries(0):
+            response_cached = self.guest_client.get(self.reverse_names[0])
+        self.assertEqual(response.content, response_cached.content)
+
+    def test_cache_index_invalidation(self):
+        """Новый и удалённый пост сразу видны на главной."""
+        cache.clear()
+        self.authorized_client.get(self.reverse_names[0])
+        post = Post.objects.create(author=self.user, text='Свежий пост')
         response = self.authorized_client.get(self.reverse_names[0])
-        post = Post.objects.first()
-        post.delete()
-        response_cached = self.authorized_client.get(self.reverse_names[0])
         self.assertContains(response, post.text)
-        self.assertContains(response_cached, post.text)
-        self.assertEqual(response.content, response_cached.content)
+        post.delete()
+        response = self.authorized_client.get(self.reverse_names[0])
+        self.assertNotContains(response, post.text)
 
 
 class FollowTest(TestCase):
@@ -220,3 +241,306 @@ class FollowTest(TestCase):
         response = self.client_auth_following.get(self.reverse_names[2])
         self.assertNotIn('Тестовая запись для тестирования',
                          response.content.decode())
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.old_post = Post.objects.create(
+            author=cls.author, text='Пост до подписки'
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_follow_backfills_and_unfollow_purges(self):
+        """Подписка добавляет старые посты автора, отписка их убирает."""
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': self.author.username}))
+        self.assertEqual(self.feed(), [self.old_post.pk])
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': self.author.username}))
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает в ленты подписчиков первым."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.feed(), [post.pk, self.old_post.pk])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=0)
+    def test_popular_author_is_merged_on_read(self):
+        """Посты авторов выше порога не раскладываются, но есть в ленте."""
+        cache.delete(PULL_AUTHORS_KEY)
+        Follow.objects.create(user=self.reader, author=self.author)
+        other = User.objects.create_user(username='other')
+        TimelineEntry.objects.create(
+            user=self.reader,
+            post=Post.objects.create(author=other, text='Из ленты'),
+            pub_date=timezone.now(),
+        )
+        post = Post.objects.create(author=self.author, text='Популярный')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        feed = self.feed()
+        cache.delete(PULL_AUTHORS_KEY)
+        self.assertEqual(len(feed), 3)
+        self.assertEqual(feed[0], post.pk)
+        self.assertIn(self.old_post.pk, feed)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='card_author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='cards',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(author=cls.user, group=cls.group,
+                                text=f'Карточка {i}')
+            for i in range(3)
+        ]
+        cls.url = reverse('posts:group_list', kwargs={'slug': 'cards'})
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def rendered_cards(self):
+        response = self.client.get(self.url)
+        return [template.name for template in response.templates].count(
+            'includes/card_posts.html'
+        )
+
+    def test_only_edited_card_is_rendered(self):
+        """После правки поста заново рендерится только его карточка."""
+        self.assertEqual(self.rendered_cards(), len(self.posts))
+        self.assertEqual(self.rendered_cards(), 0)
+        post = self.posts[0]
+        post.text = 'Исправленный текст'
+        post.save()
+        self.assertEqual(self.rendered_cards(), 1)
+        self.assertContains(self.client.get(self.url), post.text)
+
+    def test_author_rename_renders_author_cards(self):
+        """Смена имени автора обновляет его карточки."""
+        self.rendered_cards()
+        self.user.first_name = 'Новое имя'
+        self.user.save()
+        self.assertEqual(self.rendered_cards(), len(self.posts))
+
+    @override_settings(FEED_CACHE_SOFT_TIMEOUT=-1)
+    def test_one_cache_read_per_page(self):
+        """Версии и карточки всей страницы читаются одним get_many."""
+        self.rendered_cards()
+        with mock.patch('posts.cache.cache', wraps=cache) as spy, \
+                mock.patch('posts.templatetags.post_cards.cache', spy):
+            self.assertEqual(self.rendered_cards(), 0)
+        reads = [
+            name for name, args, kwargs in spy.mock_calls
+            if name in ('get', 'get_many') and 'posts:card:' in str(args)
+        ]
+        self.assertEqual(reads, ['get_many'])
+
+
+class FeedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='feed_author')
+        cls.url = reverse('posts:index')
+
+    def setUp(self):
+        cache.clear()
+        REGISTRY.values.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_hit_and_recompute_counters(self):
+        """Свежая копия считается попаданием, устаревшая пересчитывается."""
+        self.client.get(self.url)
+        self.client.get(self.url)
+        Post.objects.create(author=self.user, text='Новый пост')
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Новый пост')
+        self.assertEqual(feed_cache_stats('index_page'),
+                         {'hits': 1, 'stale': 0, 'recomputes': 2})
+
+    @override_settings(FEED_CACHE_SOFT_TIMEOUT=-1)
+    def test_soft_timeout(self):
+        """После мягкого срока страница пересчитывается и без новых постов."""
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(feed_cache_stats('index_page')['recomputes'], 2)
+
+    def test_stale_while_locked(self):
+        """Пока другой воркер пересчитывает страницу, отдаётся старая копия."""
+        self.client.get(self.url)
+        post = Post.objects.create(author=self.user, text='Новый пост')
+        with mock.patch('posts.cache.acquire_lock', return_value=False):
+            with self.assertNumQueries(0):
+                response = self.client.get(self.url)
+        self.assertNotContains(response, post.text)
+        self.assertEqual(feed_cache_stats('index_page')['stale'], 1)
+        self.assertContains(self.client.get(self.url), post.text)
+
+    def test_miss_waits_for_locked_render(self):
+        """Без копии запрос ждёт страницу от воркера с блокировкой."""
+        response = self.client.get(self.url)
+        key = get_cache_key(response.wsgi_request, 'index_page', 'GET',
+                            cache=cache)
+        entry = cache.get(key)
+        cache.delete(key)
+        with mock.patch('posts.cache.acquire_lock', return_value=False), \
+                mock.patch('posts.cache.time.sleep',
+                           side_effect=lambda _: cache.set(key, entry)):
+            with self.assertNumQueries(0):
+                self.client.get(self.url)
+        self.assertEqual(feed_cache_stats('index_page'),
+                         {'hits': 1, 'stale': 0, 'recomputes': 1})
+
+    @override_settings(FEED_CACHE_LOCK_WAIT=0)
+    def test_miss_renders_without_storing(self):
+        """Не дождавшись страницы, запрос рендерит её, но не сохраняет."""
+        Post.objects.create(author=self.user, text='Новый пост')
+        with mock.patch('posts.cache.acquire_lock', return_value=False):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Новый пост')
+        key = get_cache_key(response.wsgi_request, 'index_page', 'GET',
+                            cache=cache)
+        self.assertIsNone(key and cache.get(key))
+        self.assertEqual(feed_cache_stats('index_page')['recomputes'], 0)
+
+    def test_author_sees_own_post_while_locked(self):
+        """Автор нового поста не получает старую копию ленты."""
+        self.client.force_login(self.user)
+        self.client.get(self.url)
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Свой пост'})
+        with mock.patch('posts.cache.acquire_lock', return_value=False):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Свой пост')
+        self.assertEqual(feed_cache_stats('index_page')['stale'], 0)
+
+
+@override_settings(NUMBER_COMMENTS=5)
+class PostCommentsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='post_author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.url = reverse('posts:post_detail', kwargs={'post_id': cls.post.pk})
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def tearDown(self):
+        cache.clear()
+
+    def add_comments(self, count):
+        start = Comment.objects.count()
+        for i in range(start, start + count):
+            commenter = User.objects.create_user(username=f'commenter_{i}')
+            Comment.objects.create(post=self.post, author=commenter,
+                                   text=f'Комментарий {i}')
+
+    def test_queries_do_not_depend_on_comments(self):
+        """Число запросов страницы поста не растёт с числом комментариев."""
+        self.add_comments(2)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        self.add_comments(20)
+        with self.assertNumQueries(len(few)):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['comments']), 5)
+
+    def test_more_comments_fragment(self):
+        """Фрагмент по курсору продолжает список без повторов."""
+        self.add_comments(8)
+        first = self.client.get(self.url).context['comments']
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'cursor': first.next_cursor},
+        )
+        second = response.context['comments']
+        self.assertEqual(len(second), 3)
+        self.assertFalse(set(first) & set(second))
+        self.assertNotContains(response, 'Показать ещё')
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов лент не зависит от числа постов на странице."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='feed_queries')
+        cls.reader = User.objects.create_user(username='feed_reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='feed-queries',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def tearDown(self):
+        cache.clear()
+
+    def add_posts(self, count):
+        for i in range(count):
+            Post.objects.create(author=self.author, group=self.group,
+                                text=f'Пост {i}')
+
+    def assert_queries(self, url, expected):
+        self.add_posts(1)
+        cache.clear()
+        with self.assertNumQueries(expected):
+            self.client.get(url)
+        self.add_posts(settings.NUMBER_POSTS)
+        cache.clear()
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['page_obj']),
+                         settings.NUMBER_POSTS)
+
+    def test_index(self):
+        self.assert_queries(reverse('posts:index'), 4)
+
+    def test_group_list(self):
+        self.assert_queries(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}), 5
+        )
+
+    def test_profile(self):
+        self.assert_queries(
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            6
+        )
+
+    def test_follow_index(self):
+        self.assert_queries(reverse('posts:follow_index'), 4)
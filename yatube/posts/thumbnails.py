@@ -0,0 +1,249 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import django
+from django.conf import settings
+from django.db import transaction
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import toint
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.parsers import parse_geometry
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# sorl 12 не знает расширения для AVIF
+EXTENSIONS.setdefault('AVIF', 'avif')
+
+
+def saveable(image_format):
+    """Умеет ли установленный Pillow сохранять формат."""
+    Image.init()
+    return image_format in Image.SAVE
+
+
+def variant_formats():
+    """Форматы POST_IMAGE_VARIANTS, доступные в этом Pillow."""
+    return [
+        image_format
+        for image_format in settings.POST_IMAGE_VARIANTS['formats']
+        if saveable(image_format)
+    ]
+
+
+def variant_name(image_format, width):
+    return f'{image_format.lower()}-{width}'
+
+
+def presets():
+    """Пресеты POST_THUMBNAILS и адаптивных вариантов картинки.
+
+    Варианты не увеличивают оригинал: ширину, которой не хватило,
+    шаблон берёт из размеров готового файла.
+    """
+    config = settings.POST_IMAGE_VARIANTS
+    aspect_x, aspect_y = config['aspect']
+    found = dict(settings.POST_THUMBNAILS)
+    for image_format in variant_formats():
+        for width in config['widths']:
+            height = max(1, round(width * aspect_y / aspect_x))
+            found[variant_name(image_format, width)] = (f'{width}x{height}', {
+                'crop': 'center', 'upscale': False, 'format': image_format,
+            })
+    return found
+
+
+def thumbnail_file(image, preset):
+    """Файл миниатюры пресета POST_THUMBNAILS, как его назовёт sorl.
+
+    Повторяет подготовку опций ThumbnailBackend.get_thumbnail,
+    чтобы найти готовую миниатюру, не открывая оригинал.
+    """
+    geometry, options = presets()[preset]
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def thumbnail_size(post, preset='card'):
+    """Размер миниатюры по сохранённым размерам оригинала.
+
+    Повторяет масштабирование и обрезку движка sorl, не открывая
+    ни файлов, ни хранилища; None, пока размеры не заполнены.
+    """
+    width, height = post.image_width, post.image_height
+    if not width or not height:
+        return None
+    geometry, options = presets()[preset]
+    box_x, box_y = parse_geometry(geometry, width / height)
+    crop = options.get('crop')
+    ratios = (box_x / width, box_y / height)
+    factor = max(ratios) if crop else min(ratios)
+    if factor < 1 or options.get('upscale', sorl_settings.THUMBNAIL_UPSCALE):
+        width, height = toint(width * factor), toint(height * factor)
+    if crop:
+        width, height = min(width, box_x), min(height, box_y)
+    return width, height
+
+
+def lookup(image, preset):
+    """Готовая миниатюра из хранилища sorl или None; ничего не генерирует."""
+    if not image:
+        return None
+    return lookup_many([image], [preset])[image.name, preset]
+
+
+def lookup_many(images, names):
+    """Готовые миниатюры картинок за один проход по хранилищу sorl.
+
+    Возвращает словарь {(имя оригинала, пресет): миниатюра или None}.
+    """
+    keys = {
+        (image.name, preset): add_prefix(thumbnail_file(image, preset).key)
+        for image in images if image
+        for preset in names
+    }
+    values = get_raw_many(set(keys.values()))
+    return {
+        pair: deserialize_image_file(values[key]) if values.get(key) else None
+        for pair, key in keys.items()
+    }
+
+
+def get_raw_many(keys):
+    """Записи хранилища sorl: один get_many в кэш и один запрос к базе
+    на промахи вместо пары обращений на каждую картинку.
+
+    В отличие от sorl отсутствие миниатюры не кэшируется: её создаёт
+    другой процесс, и его запись не сбросит кэш веб-процесса.
+    """
+    # Модели sorl импортируются здесь: модуль загружают процессы пула
+    # до django.setup() в setup_worker.
+    from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+    from sorl.thumbnail.models import KVStore as KVStoreModel
+
+    kvstore = default.kvstore
+    if not keys:
+        return {}
+    if not isinstance(kvstore, KVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = {
+        key: value for key, value in kvstore.cache.get_many(keys).items()
+        if value != EMPTY_VALUE
+    }
+    missing = keys - values.keys()
+    if missing:
+        stored = dict(KVStoreModel.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        kvstore.cache.set_many(stored, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(stored)
+    return values
+
+
+def prefetch(posts, names=None):
+    """Разложить по постам страницы их готовые миниатюры.
+
+    names — пресеты, по умолчанию все. Карточки читают миниатюры
+    через for_post, не обращаясь к хранилищу.
+    """
+    names = list(presets()) if names is None else names
+    posts = [post for post in posts if post.image]
+    found = lookup_many([post.image for post in posts], names)
+    for post in posts:
+        ready = post.__dict__.setdefault('_prefetched_thumbnails', {})
+        for preset in names:
+            ready[preset] = found[post.image.name, preset]
+    return posts
+
+
+def for_post(post, preset='card'):
+    """Миниатюра поста из prefetch; без него загружаются все пресеты."""
+    if not post.image:
+        return None
+    if preset not in getattr(post, '_prefetched_thumbnails', {}):
+        prefetch([post])
+    return post._prefetched_thumbnails[preset]
+
+
+def ready(post):
+    """Готовы ли все миниатюры и варианты картинки поста."""
+    return all(for_post(post, preset) for preset in presets())
+
+
+def generate(name):
+    """Создать миниатюры всех пресетов для загруженного файла name."""
+    for geometry, options in presets().values():
+        get_thumbnail(name, geometry, **options)
+
+
+def setup_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def make_pool(workers):
+    """Пул процессов с настроенным Django.
+
+    Процессы запускаются через spawn: дочерний процесс не наследует
+    соединения с базой и блокировки родителя.
+    """
+    return ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=setup_worker,
+        initargs=(os.environ['DJANGO_SETTINGS_MODULE'],),
+    )
+
+
+def pool():
+    """Общий пул веб-процесса, создаётся при первой задаче."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = make_pool(settings.POST_THUMBNAIL_WORKERS)
+    return _pool
+
+
+def report(name, future):
+    error = future.exception()
+    if error is not None:
+        logger.error('Thumbnails for %s failed: %r', name, error)
+
+
+def submit(name):
+    """Отдать файл пулу; без POST_THUMBNAIL_WORKERS — создать сразу."""
+    if not settings.POST_THUMBNAIL_WORKERS:
+        generate(name)
+        return None
+    future = pool().submit(generate, name)
+    future.add_done_callback(partial(report, name))
+    return future
+
+
+def enqueue(image):
+    """Поставить миниатюры картинки в очередь после фиксации транзакции."""
+    if image:
+        name = image.name
+        transaction.on_commit(lambda: submit(name))
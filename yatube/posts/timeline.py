@@ -0,0 +1,111 @@
+import heapq
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .paginator import CursorPaginator
+
+PULL_AUTHORS_KEY = 'timeline:pull_authors'
+
+
+def pull_authors():
+    """Авторы, чьи посты не раскладываются по лентам, а читаются на лету.
+
+    Это авторы, у которых подписчиков больше TIMELINE_FANOUT_THRESHOLD:
+    запись поста в сотни тысяч лент остановила бы их публикацию.
+    Множество кэшируется, поэтому и запись, и чтение видят один режим.
+    Автор, опустившийся ниже порога, снова раскладывает только новые посты.
+    """
+    authors = cache.get(PULL_AUTHORS_KEY)
+    if authors is None:
+        authors = frozenset(
+            AuthorStats.objects.filter(
+                followers_count__gt=settings.TIMELINE_FANOUT_THRESHOLD
+            ).values_list('user_id', flat=True)
+        )
+        cache.set(PULL_AUTHORS_KEY, authors,
+                  settings.TIMELINE_PULL_AUTHORS_TIMEOUT)
+    return authors
+
+
+def fan_out(post):
+    """Разложить новый пост по лентам подписчиков автора."""
+    if post.author_id in pull_authors():
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers.iterator())
+    )
+
+
+def backfill(follow):
+    """Добавить в ленту подписчика последние посты нового автора."""
+    if follow.author_id in pull_authors():
+        return
+    posts = Post.objects.filter(author_id=follow.author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:settings.TIMELINE_BACKFILL]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=follow.user_id, post_id=post_id,
+                       pub_date=pub_date) for post_id, pub_date in posts],
+        ignore_conflicts=True,
+    )
+
+
+def purge(follow):
+    """Убрать из ленты посты автора, от которого отписались."""
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id
+    ).delete()
+
+
+class TimelinePaginator(CursorPaginator):
+    """Лента подписок, листаемая по индексу (user, pub_date, post).
+
+    Посты авторов из pull_authors() подмешиваются при чтении:
+    отсортированные выборки по каждому такому автору сливаются
+    с готовой лентой k-way слиянием.
+    """
+
+    def __init__(self, user, per_page):
+        super().__init__(
+            Post.objects.for_follower(user),
+            per_page,
+            lookups=('pub_date', 'post_id'),
+        )
+        pulled = pull_authors()
+        self.pulled = list(
+            user.follower.filter(author_id__in=pulled).values_list(
+                'author_id', flat=True
+            )
+        ) if pulled else []
+
+    def fetch(self, values, backwards, limit):
+        entries = super().fetch(values, backwards, limit)
+        sources = [[entry.post for entry in entries]]
+        for author_id in self.pulled:
+            author_posts = CursorPaginator(
+                Post.objects.by_author(author_id), self.per_page
+            )
+            sources.append(author_posts.fetch(values, backwards, limit))
+        if len(sources) == 1:
+            return sources[0]
+        merged = heapq.merge(
+            *sources,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=not backwards,
+        )
+        posts, seen = [], set()
+        for post in merged:
+            # Пост мог попасть в ленту, пока автор был ниже порога.
+            if post.pk in seen:
+                continue
+            seen.add(post.pk)
+            posts.append(post)
+            if len(posts) == limit:
+                break
+        return posts
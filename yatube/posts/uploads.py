@@ -0,0 +1,144 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps, ImageSequence
+
+from .thumbnails import saveable
+
+# Служебные поля, которые переживают пересохранение: без них
+# пропадёт прозрачность и цвета. EXIF, XMP и комментарии удаляются.
+KEEP_INFO = ('transparency', 'icc_profile')
+# Форматы, которые Pillow читает, но сохраняет под другим именем
+SAVE_AS = {'MPO': 'JPEG'}
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+
+
+def too_large():
+    return ValidationError(
+        'Файл больше %(limit)s.', code='file_too_large',
+        params={'limit': filesizeformat(settings.UPLOAD_MAX_BYTES)},
+    )
+
+
+def skip_sub_blocks(file):
+    while True:
+        size = file.read(1)
+        if not size or not size[0]:
+            return
+        file.seek(size[0], os.SEEK_CUR)
+
+
+def gif_frames(file):
+    """Число кадров GIF по структуре блоков, без декодирования.
+
+    n_frames из Pillow для GIF распаковывает все кадры по очереди.
+    """
+    file.seek(10)
+    flags = file.read(3)[:1]
+    if flags and flags[0] & 0x80:
+        file.seek(3 << ((flags[0] & 7) + 1), os.SEEK_CUR)
+    frames = 0
+    while True:
+        block = file.read(1)
+        if block == b'!':
+            file.read(1)
+        elif block == b',':
+            descriptor = file.read(9)
+            if len(descriptor) < 9:
+                return frames
+            frames += 1
+            if descriptor[8] & 0x80:
+                file.seek(3 << ((descriptor[8] & 7) + 1), os.SEEK_CUR)
+            file.read(1)
+        else:
+            return frames
+        skip_sub_blocks(file)
+
+
+def check_limits(file):
+    """Отклонить до декодирования файл больше UPLOAD_MAX_BYTES, картинку
+    больше POST_IMAGE_MAX_PIXELS (у анимации — в сумме по всем кадрам)
+    и формат, который Pillow читает, но не умеет записать.
+    """
+    if file.size > settings.UPLOAD_MAX_BYTES:
+        raise too_large()
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+            frames = (gif_frames(file) if image.format == 'GIF'
+                      else getattr(image, 'n_frames', 1))
+            pixels = width * height * max(frames, 1)
+            image_format = SAVE_AS.get(image.format, image.format)
+    except Image.DecompressionBombError:
+        pixels, image_format = settings.POST_IMAGE_MAX_PIXELS + 1, None
+    except OSError:
+        # Не картинка: ошибку выдаст ImageField.
+        return
+    finally:
+        file.seek(0)
+    if pixels > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)s мегапикселей.', code='too_many_pixels',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+    if not saveable(image_format):
+        raise ValidationError(
+            'Формат %(format)s не поддерживается.', code='invalid_format',
+            params={'format': image_format},
+        )
+
+
+def clean_frame(image):
+    """Кадр не больше POST_IMAGE_MAX_SIDE, повёрнутый по EXIF,
+    без метаданных, кроме KEEP_INFO."""
+    side = settings.POST_IMAGE_MAX_SIDE
+    image.thumbnail((side, side), Image.LANCZOS, reducing_gap=3.0)
+    image = ImageOps.exif_transpose(image)
+    image.info = {
+        key: value for key, value in image.info.items() if key in KEEP_INFO
+    }
+    return image
+
+
+def normalize(file):
+    """Пересохранить загруженную картинку: не больше POST_IMAGE_MAX_SIDE
+    по длинной стороне, с применённой ориентацией EXIF и без метаданных.
+
+    Уменьшение идёт через thumbnail(): JPEG декодируется сразу
+    уменьшенным (draft), остальные форматы — через reduce().
+    Имя и формат файла сохраняются; анимация сохраняет все кадры,
+    их длительность и повторы. save_all держит в памяти все уменьшенные
+    кадры, поэтому их число ограничено в check_limits.
+    """
+    file.seek(0)
+    output = BytesIO()
+    with Image.open(file) as image:
+        image_format = SAVE_AS.get(image.format, image.format)
+        options = dict(SAVE_OPTIONS.get(image_format, {}))
+        if getattr(image, 'is_animated', False):
+            frames, durations = [], []
+            loop = image.info.get('loop', 0)
+            for frame in ImageSequence.Iterator(image):
+                durations.append(frame.info.get('duration', 100))
+                frames.append(clean_frame(frame.copy()))
+            image = frames[0]
+            options.update(
+                save_all=True, append_images=frames[1:],
+                duration=durations, loop=loop,
+            )
+        else:
+            image = clean_frame(image)
+        image.save(output, image_format, **options)
+    return SimpleUploadedFile(
+        file.name, output.getvalue(),
+        content_type=Image.MIME.get(image_format, file.content_type),
+    )
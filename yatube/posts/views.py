@@ -1,83 +1,137 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.shortcuts import redirect, render
 
+from . import sharding, thumbnails
+from .cache import cache_feed, feed_cache_context
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-
-
-def get_page_context(post_list, request):
-    paginator = Paginator(post_list, settings.NUMBER_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+from .lookups import groups, users
+from .models import AuthorStats, Comment, Follow, Post
+from .paginator import CursorPaginator, FeedPaginator
+from .sharding import ShardedFeedPaginator, ShardedPaginator
+from .timeline import TimelinePaginator
+
+
+def get_page_context(post_list, request, databases=None, count=None):
+    if sharding.enabled():
+        paginator = ShardedFeedPaginator(
+            post_list, settings.NUMBER_POSTS, count, databases=databases
+        )
+    else:
+        paginator = FeedPaginator(post_list, settings.NUMBER_POSTS, count)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     return page_obj
 
 
-@cache_page(20, key_prefix="index_page")
+@cache_feed(key_prefix="index_page")
 def index(request):
-    post_list = Post.objects.select_related('author', 'group')
+    post_list = Post.objects.feed()
     return render(request, 'posts/index.html', {
-        'page_obj': get_page_context(post_list, request), "index": True
+        'page_obj': get_page_context(post_list, request), "index": True,
+        **feed_cache_context(),
     })
 
 
+@cache_feed(key_prefix='group_page')
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    group = groups.get_or_404(slug)
+    post_list = Post.objects.by_group(group)
     return render(request, 'posts/group_list.html', {
         'group': group,
         'page_obj': get_page_context(post_list, request),
     })
 
 
+def posts_count(author):
+    """Счётчик постов автора или None, если у него нет AuthorStats
+    (loaddata, bulk_create): тогда посты посчитает cached_count."""
+    try:
+        return author.stats.posts_count
+    except AuthorStats.DoesNotExist:
+        return None
+
+
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
+    author = users.get_or_404(username)
+    post_list = Post.objects.by_author(author)
     following = request.user.is_authenticated and (
         request.user.follower.filter(author=author).exists()
     )
+    databases = (
+        [sharding.shard_for_author(author.pk)] if sharding.enabled() else None
+    )
     return render(request, 'posts/profile.html', {
-        'page_obj': get_page_context(post_list, request),
+        'page_obj': get_page_context(
+            post_list, request, databases, posts_count(author)
+        ),
         'author': author,
         "following": following,
     })
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
+    post = sharding.get_post_or_404(
+        Post.objects.select_related('author__stats', 'group'), post_id
+    )
     author = post.author
     form = CommentForm(request.POST or None)
     return render(request, 'posts/post_detail.html', {
         'post': post,
         'author': author,
-        'comments': comments,
+        'comments': get_comments_page(post.pk, request, post._state.db),
         'form': form,
     })
 
 
+def post_comments(request, post_id):
+    """Следующая страница комментариев: фрагмент для подгрузки."""
+    return render(request, 'includes/comment_list.html', {
+        'post': Post(pk=post_id),
+        'comments': get_comments_page(post_id, request),
+    })
+
+
+def get_comments_page(post_id, request, database=None):
+    comments = Comment.objects.filter(post_id=post_id)
+    if sharding.enabled():
+        database = database or sharding.shard_for_post(post_id)
+        paginator = ShardedPaginator(
+            comments, settings.NUMBER_COMMENTS,
+            [database] if database else [],
+            keys=('created', 'id'),
+        )
+    else:
+        paginator = CursorPaginator(
+            comments.select_related('author'),
+            settings.NUMBER_COMMENTS,
+            keys=('created', 'id'),
+        )
+    return paginator.get_page(request.GET.get('cursor'))
+
+
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         form.save()
+        thumbnails.enqueue(post.image)
         return redirect('posts:profile', request.user)
     return render(request, 'includes/create_post.html', {'form': form})
 
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = sharding.get_post_or_404(Post.objects.all(), post_id)
     if request.user != post.author:
         return redirect('posts:post_detail', post.pk,)
     form = PostForm(request.POST or None,
                     files=request.FILES or None, instance=post)
     if form.is_valid():
         post.save()
+        if 'image' in form.changed_data:
+            thumbnails.enqueue(post.image)
         return redirect('posts:post_detail', post.pk,)
     return render(request, 'includes/create_post.html', {
         'form': form,
@@ -86,7 +140,7 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = Post.objects.get(id=post_id)
+    post = sharding.get_post_or_404(Post.objects.all(), post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -98,9 +152,20 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
+    if sharding.enabled():
+        # Ленты TimelineEntry в default не ссылаются на посты в шардах:
+        # лента подписок собирается из шардов при чтении.
+        authors = list(
+            request.user.follower.values_list('author_id', flat=True)
+        )
+        paginator = ShardedPaginator(
+            Post.objects.feed().filter(author_id__in=authors),
+            settings.NUMBER_POSTS,
+        )
+    else:
+        paginator = TimelinePaginator(request.user, settings.NUMBER_POSTS)
     context = {
-        'page_obj': get_page_context(post_list, request),
+        'page_obj': paginator.get_page(request.GET.get('cursor')),
         'follow': True
     }
     return render(request, "posts/follow.html", context)
@@ -109,7 +174,7 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     follower = request.user
-    following = get_object_or_404(User, username=username)
+    following = users.get_or_404(username)
     if follower != following:
         Follow.objects.get_or_create(user=follower, author=following)
     return redirect("posts:profile", username=username)
@@ -118,6 +183,6 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     follower = request.user
-    following = get_object_or_404(User, username=username)
+    following = users.get_or_404(username)
     follower.follower.filter(author=following).delete()
     return redirect("posts:profile", username=username)
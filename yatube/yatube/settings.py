@@ -47,6 +47,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.timing.ServerTimingMiddleware',
+    'core.middleware.metrics.MetricsMiddleware',
+    'core.middleware.slow_queries.SlowQueryMiddleware',
+    'core.middleware.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,14 +58,75 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.queries.NPlusOneMiddleware',
 ]
 
+# Поиск N+1 в шаблонах: в разработке пишет в лог,
+# в тестах (core.runner.TEST_SETTINGS, и в manage.py test, и в pytest)
+# роняет страницу
+N_PLUS_ONE_DETECTION = DEBUG
+N_PLUS_ONE_THRESHOLD = 3
+N_PLUS_ONE_RAISE = False
+
+TEST_RUNNER = 'core.runner.TestRunner'
+
+# Заголовок Server-Timing и строка лога с временем SQL, шаблонов
+# и обращениями к кэшу; измеряется доля SAMPLE_RATE запросов
+SERVER_TIMING = DEBUG
+SERVER_TIMING_SAMPLE_RATE = 1.0
+
+# Счётчики для /metrics: каждый воркер раз в FLUSH_INTERVAL секунд
+# пишет свои значения в METRICS_DIR, /metrics их складывает
+METRICS = False
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 1
+
+# Запросы дольше порога (в секундах) пишутся в журнал вместе с планом;
+# одна форма запроса — не чаще раза в LOG_INTERVAL секунд.
+# Отчёт: python manage.py slow_queries
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'logs', 'slow_queries.jsonl')
+SLOW_QUERY_LOG_INTERVAL = 60
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 ROOT_URLCONF = 'yatube.urls'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки: файл больше UPLOAD_MAX_BYTES обрывается при приёме
+# (core.uploads), картинка поста больше POST_IMAGE_MAX_PIXELS
+# (у анимации — в сумме по кадрам) отклоняется по заголовку, остальные пересохраняются с длинной
+# стороной не больше POST_IMAGE_MAX_SIDE (posts.uploads).
+FILE_UPLOAD_HANDLERS = [
+    'core.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+POST_IMAGE_MAX_SIDE = 2560
+
+# Миниатюры из шаблонов: создаются после загрузки картинки
+# (posts.thumbnails), при рендере выводится готовая или заглушка
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+# Адаптивные варианты картинки поста для <picture>: ширины с пропорциями
+# карточки в форматах по убыванию предпочтения. Форматы, которые
+# установленный Pillow не умеет сохранять, пропускаются; последний
+# формат — запасной srcset для <img>.
+POST_IMAGE_VARIANTS = {
+    'widths': (480, 960, 1440),
+    'aspect': (960, 339),
+    'formats': ('AVIF', 'WEBP', 'JPEG'),
+    'sizes': '(max-width: 960px) 100vw, 960px',
+}
+
+# Процессы пула миниатюр; 0 — создавать сразу после сохранения поста
+POST_THUMBNAIL_WORKERS = 0 if DEBUG else 2
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -99,9 +164,64 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    # Тот же файл, отдельное соединение только для чтения
+    'reader': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.routers.ReplicaRouter',
+]
+
+DATABASE_READ_ALIAS = 'reader'
+
+# Реплики для чтения лент. Локально это копии db.sqlite3,
+# которые обновляет python manage.py sync_replicas --interval 5:
+# DATABASES['replica1'] = {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': os.path.join(BASE_DIR, 'db-replica1.sqlite3'),
+#     'TEST': {'MIRROR': 'default'},
+# }
+# DATABASE_REPLICAS = ['replica1']
+DATABASE_REPLICAS = []
+
+DATABASE_REPLICA_VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+)
+
+# Сколько секунд после записи пользователь читает основную базу
+DATABASE_REPLICA_STICKY_SECONDS = 10
+
+# Применяются к каждому новому соединению SQLite (core.db)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
 }
 
+SQLITE_READ_ONLY_ALIASES = ('reader',)
+
+# Шарды постов и комментариев по автору (posts.sharding). Пустой
+# список — всё в default. Включение: добавить алиасы, выполнить
+# migrate --database для каждого и rebalance_shards до открытия записи:
+# DATABASES['posts1'] = {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': os.path.join(BASE_DIR, 'db-posts1.sqlite3'),
+# }
+# POST_SHARDS = ['posts1', 'posts2']
+POST_SHARDS = []
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -145,10 +265,53 @@ STATIC_URL = '/static/'
 
 NUMBER_POSTS = 10
 
+# Число постов ленты больше этого порога выводится как приблизительное
+# и пересчитывается раз в PAGINATOR_APPROX_TIMEOUT секунд (FeedPaginator)
+PAGINATOR_APPROX_COUNT = 10000
+
+PAGINATOR_APPROX_TIMEOUT = 10 * 60
+
 COUNT_POSTS = 15
 
+# Комментарии на странице поста, остальные подгружаются по курсору
+NUMBER_COMMENTS = 20
+
+# Сколько последних постов автора попадает в ленту при подписке
+TIMELINE_BACKFILL = 200
+
+# Авторы с большим числом подписчиков не раскладывают посты по лентам,
+# их посты подмешиваются в ленту при чтении
+TIMELINE_FANOUT_THRESHOLD = 10000
+
+TIMELINE_PULL_AUTHORS_TIMEOUT = 300
+
+# Страницы лент сбрасываются сигналами, поэтому могут жить долго
+FEED_CACHE_TIMEOUT = 60 * 60 * 2
+
+# После этого срока страница ленты пересчитывается одним запросом,
+# остальные пока получают старую копию
+FEED_CACHE_SOFT_TIMEOUT = 20
+
+# Сколько держится блокировка пересчёта, если воркер упал
+FEED_CACHE_LOCK_TIMEOUT = 30
+
+# Сколько секунд запрос без блокировки ждёт страницу, которой ещё нет
+# в кэше, прежде чем отрендерить её сам
+FEED_CACHE_LOCK_WAIT = 1
+
+# Группы по slug и пользователи по username: сколько держать
+# в памяти процесса и сколько в общем кэше
+LOOKUP_CACHE_SIZE = 1000
+
+LOOKUP_CACHE_TIMEOUT = 60 * 60
+
+# Общий кэш воркеров gunicorn на одном хосте без Redis: сброс версий
+# лент, карточек и справочников виден всем процессам сразу.
+# Тесты подменяют его на LocMemCache (core.runner.TEST_SETTINGS).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {'MAX_BYTES': 256 * 1024 * 1024},
     }
 }
@@ -18,11 +18,14 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import metrics
+
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('', include('posts.urls', namespace='posts')),